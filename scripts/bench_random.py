@@ -0,0 +1,45 @@
+"""Benchmark of `QueryManager.random` against `ORDER BY random() LIMIT n`.
+
+Sampling by primary key costs about the same for any table size (it depends on
+`n`), while sorting by `random()` grows with the number of rows.
+
+    DB_SQLITE_PATH=:memory: python scripts/bench_random.py
+"""
+
+import timeit
+
+from sqlalchemy import func, insert, pool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from fpbase2.models import Protein
+from fpbase2.models._manager import Manager
+
+SIZES = [1_000, 10_000, 100_000]
+N = 10
+REPEAT = 50
+SORTED = select(Protein).order_by(func.random()).limit(N)
+
+
+def make_session(rows: int) -> Session:
+    engine = create_engine("sqlite://", poolclass=pool.StaticPool)
+    SQLModel.metadata.create_all(engine)
+    values = [
+        {"name": f"FP {i}", "slug": f"fp-{i}", "uuid": f"{i:05X}"} for i in range(rows)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Protein), values)
+    return Session(engine)
+
+
+def bench(label: str, rows: int, func: object) -> None:
+    seconds = timeit.timeit(func, number=REPEAT)  # type: ignore [arg-type]
+    print(f"{label:<22} {rows:>8} rows  {seconds / REPEAT * 1e3:8.2f} ms/call")
+
+
+if __name__ == "__main__":
+    for rows in SIZES:
+        session = make_session(rows)
+        Manager.set_session(session)
+        bench("ORDER BY random()", rows, lambda s=session: s.exec(SORTED).all())
+        bench("objects.random", rows, lambda: Protein.objects.random(N))
+        session.close()
@@ -0,0 +1,50 @@
+"""Micro-benchmark of the per-statement cost of the read-only guard.
+
+Compares the uncached and memoized versions of `can_modify_database` on statements
+like those emitted by the API, and the cost of a query on an engine guarded by
+statement classification vs one using the database's own read-only mode.
+
+    python scripts/bench_read_only_guard.py
+"""
+
+import timeit
+
+from sqlalchemy import create_engine, pool, text
+
+from fpbase2.core.utils import can_modify_database, make_engine_read_only
+
+STATEMENTS = [
+    "SELECT protein.id, protein.name, protein.slug, protein.seq, protein.uuid "
+    "FROM protein ORDER BY protein.id LIMIT ? OFFSET ?",
+    "SELECT protein.id, protein.modified FROM protein WHERE protein.id = ?",
+    "UPDATE protein SET name=?, modified=? WHERE protein.id = ?",
+    "INSERT INTO protein (name, slug, uuid) VALUES (?, ?, ?)",
+]
+N = 100_000
+
+
+def bench(label: str, func: object, number: int = N) -> None:
+    seconds = timeit.timeit(
+        "for s in STATEMENTS: func(s)",
+        globals={"func": func, "STATEMENTS": STATEMENTS},
+        number=number,
+    )
+    per_call = seconds / (number * len(STATEMENTS)) * 1e9
+    print(f"{label:<28} {per_call:8.0f} ns/statement")
+
+
+def bench_engine(label: str, native: bool) -> None:
+    engine = create_engine("sqlite://", poolclass=pool.StaticPool)
+    make_engine_read_only(engine, native=native)
+    with engine.connect() as conn:
+        stmt = text("SELECT name, type FROM sqlite_master WHERE rootpage = :id")
+        seconds = timeit.timeit(lambda: conn.execute(stmt, {"id": 1}), number=N // 10)
+    print(f"{label:<28} {seconds / (N // 10) * 1e6:8.2f} us/query")
+
+
+if __name__ == "__main__":
+    bench("classifier, uncached", can_modify_database.__wrapped__)
+    bench("classifier, memoized", can_modify_database)
+    print(can_modify_database.cache_info())
+    bench_engine("keyword guard engine", native=False)
+    bench_engine("native read-only engine", native=True)
@@ -76,7 +76,8 @@ def rebuild(
 
     typer.echo(f"Rebuilding database... {settings.SQLALCHEMY_DATABASE_URI}")
     if settings.DB_SQLITE_PATH:
-        Path(settings.DB_SQLITE_PATH).unlink(missing_ok=True)
+        for suffix in ("", "-wal", "-shm"):  # include WAL mode side files
+            Path(f"{settings.DB_SQLITE_PATH}{suffix}").unlink(missing_ok=True)
         with Session(engine) as session:
             init_db(session)
             Manager.set_session(session)
@@ -88,6 +89,64 @@ def rebuild(
         shell()
 
 
+@app.command()
+def backfill(
+    batch_size: int = typer.Option(1000, help="Rows to update per transaction."),
+) -> None:
+    """Add and fill derived columns, tables and indexes (e.g. `seq_digest`)."""
+    from sqlalchemy import inspect, text
+    from sqlmodel import Session
+
+    from fpbase2 import crud
+    from fpbase2.core.db import engine
+    from fpbase2.models.protein import Protein, ProteinIdentifier
+    from fpbase2.utils.fulltext import create_fulltext
+
+    table = Protein.__table__  # type: ignore [attr-defined]
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                typer.echo(f"Adding column {table.name}.{column.name}")
+                type_ = column.type.compile(engine.dialect)
+                conn.execute(
+                    text(f"ALTER TABLE {table.name} ADD {column.name} {type_}")
+                )
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+        create_fulltext(conn, table)
+        ProteinIdentifier.__table__.create(conn, checkfirst=True)  # type: ignore [attr-defined]
+
+    with Session(engine) as session:
+        count = crud.backfill_seq_digests(session=session, batch_size=batch_size)
+        typer.echo(f"Computed seq_digest for {count} protein(s)")
+        count = crud.backfill_identifiers(session=session, batch_size=batch_size)
+        typer.echo(f"Wrote {count} alias/PDB identifier row(s)")
+
+
+@app.command()
+def duplicates(
+    threshold: float = typer.Option(
+        0.8, min=0, max=1, help="Minimum (estimated) k-mer Jaccard similarity."
+    ),
+) -> None:
+    """List clusters of proteins with nearly identical sequences."""
+    from sqlmodel import Session
+
+    from fpbase2.core.db import read_engine
+    from fpbase2.models._manager import Manager
+    from fpbase2.models.protein import Protein
+
+    with Session(read_engine) as session:
+        Manager.set_session(session)
+        clusters = Protein.objects.near_duplicates("seq", threshold)
+        for n, cluster in enumerate(clusters, 1):
+            typer.echo(f"cluster {n}:")
+            for protein in cluster:
+                typer.echo(f"  {protein.id:>6}  {protein.slug}  ({protein.name})")
+    typer.echo(f"{len(clusters)} candidate duplicate cluster(s)")
+
+
 @app.command()
 def check() -> None:
     """Run checks"""
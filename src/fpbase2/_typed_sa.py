@@ -44,6 +44,24 @@ def on_before_insert(
     return listens_for(target, "before_insert", *args, **kw)
 
 
+# https://docs.sqlalchemy.org/orm/events.html#sqlalchemy.orm.MapperEvents.after_update
+def on_after_update(
+    target: type[T], *args: Any, **kw: Any
+) -> Callable[
+    [Callable[[Mapper, Connection, T], Any]], Callable[[Mapper, Connection, T], Any]
+]:
+    return listens_for(target, "after_update", *args, **kw)
+
+
+# https://docs.sqlalchemy.org/orm/events.html#sqlalchemy.orm.MapperEvents.after_delete
+def on_after_delete(
+    target: type[T], *args: Any, **kw: Any
+) -> Callable[
+    [Callable[[Mapper, Connection, T], Any]], Callable[[Mapper, Connection, T], Any]
+]:
+    return listens_for(target, "after_delete", *args, **kw)
+
+
 class EventDecorator(ModelPrivateAttr):
     def __init__(self, fn: Callable, events: Sequence[str] = ()) -> None:
         super().__init__()
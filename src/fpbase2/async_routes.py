@@ -0,0 +1,124 @@
+"""Async versions of the CRUD routes in `fpbase2.main`.
+
+When `settings.ASYNC_DB` is set, these handlers are registered in place of their
+sync counterparts (see `main.async_alternative`). Sync handlers run in a
+threadpool and hold a thread while waiting on the database, so concurrency is
+capped by the threadpool size. Async handlers release the event loop while
+waiting instead, so concurrency is limited only by the connection pool.
+
+Signatures (and therefore the OpenAPI schema) must match the sync routes.
+"""
+
+from collections.abc import Sequence
+from typing import Annotated
+
+from fastapi import Depends, HTTPException, Query, Request, Response
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from fpbase2 import crud
+from fpbase2.core.db import get_async_session
+from fpbase2.models.protein import (
+    Protein,
+    ProteinCreate,
+    ProteinFilter,
+    ProteinPatch,
+    ProteinRead,
+    ProteinUpdate,
+)
+
+from .utils import (
+    acreate_object,
+    adelete_object,
+    apatch_object,
+    aread_or_404,
+    aupdate_object,
+)
+from .utils.conditional import is_conditional, not_modified, validators
+from .utils.pagination import CursorKey, Page, acount_rows, apaginate
+
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+
+
+async def create_protein(
+    *, session: AsyncSessionDep, response: Response, protein: ProteinCreate
+) -> Protein:
+    db_protein = await acreate_object(session, Protein, protein)
+    if (statement := crud.same_seq_statement(db_protein)) is not None:
+        if duplicates := (await session.exec(statement)).all():
+            response.headers["X-Duplicate-Of"] = ",".join(map(str, duplicates))
+    return db_protein
+
+
+async def read_proteins(
+    *,
+    session: AsyncSessionDep,
+    request: Request,
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=100),
+    cursor: str | None = None,
+    order_by: CursorKey = "id",
+    filters: Annotated[ProteinFilter, Depends()],
+    count: bool = False,
+) -> Sequence[Protein] | Response:
+    where = filters.clauses()
+    page: Page = {
+        "limit": limit,
+        "offset": offset,
+        "cursor": cursor,
+        "order_by": order_by,
+        "where": where,
+    }
+    extra: dict[str, str] = {}
+    if count:
+        extra["X-Total-Count"] = str(await acount_rows(session, Protein, where))
+    if is_conditional(request, last_modified=False):
+        stamps, next_cursor = await apaginate(
+            session, Protein, **page, entities=(Protein.id, Protein.modified)
+        )
+        headers = {**validators(stamps, last_modified=False), **extra}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        if not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+    proteins, next_cursor = await apaginate(session, Protein, **page)
+    response.headers.update(validators(proteins, last_modified=False))
+    response.headers.update(extra)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return proteins
+
+
+async def read_protein(
+    *, session: AsyncSessionDep, request: Request, response: Response, protein_id: int
+) -> Protein | Response:
+    if is_conditional(request):
+        stmt = select(Protein.id, Protein.modified).where(Protein.id == protein_id)
+        if (stamp := (await session.exec(stmt)).first()) is None:
+            raise HTTPException(status_code=404, detail="Protein not found")
+        headers = validators([stamp])  # type: ignore [list-item]
+        if not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+    protein = await aread_or_404(session, Protein, protein_id)
+    response.headers.update(validators([protein]))
+    return protein
+
+
+async def update_protein(
+    *, session: AsyncSessionDep, protein_id: int, protein: ProteinUpdate
+) -> Protein:
+    return await aupdate_object(session, Protein, protein_id, protein)
+
+
+async def patch_protein(
+    *, session: AsyncSessionDep, protein_id: int, protein: ProteinPatch
+) -> ProteinRead:
+    row = await apatch_object(session, Protein, protein_id, protein)
+    return ProteinRead.model_validate(row)
+
+
+async def delete_protein(*, session: AsyncSessionDep, protein_id: int) -> dict:
+    return await adelete_object(session, Protein, protein_id)
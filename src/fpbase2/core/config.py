@@ -13,6 +13,14 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 DBScheme = Literal["sqlite", "postgresql", "postgresql+psycopg"]
 
 
+def to_async_uri(uri: str) -> str:
+    """Return the async-driver equivalent of a database URI."""
+    if uri.startswith("sqlite:"):
+        return uri.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    # psycopg (3) supports both sync and async use under the same dialect name
+    return uri
+
+
 def parse_cors(v: Any) -> list[str] | str:
     if isinstance(v, str) and not v.startswith("["):
         return [i.strip() for i in v.split(",")]
@@ -79,6 +87,33 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # Serve the CRUD routes from async handlers, using an async engine
+    # (aiosqlite for sqlite, psycopg's async mode for postgres).
+    ASYNC_DB: bool = False
+
+    @computed_field  # type: ignore[misc]
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:
+        return to_async_uri(str(self.SQLALCHEMY_DATABASE_URI))
+
+    # Optional read-only replica (full DSN). If set, GET requests are served from
+    # the replica, while all other requests (writes) are pinned to the primary.
+    DB_READ_REPLICA_URI: str | None = None
+
+    # Connection pool settings (an in-memory sqlite database always uses a single
+    # connection; a sqlite file uses the size, overflow, and timeout)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    # seconds to wait for a connection from the pool before giving up
+    DB_POOL_TIMEOUT: float = 30
+    # test connections for liveness before handing them out of the pool (postgres only)
+    DB_POOL_PRE_PING: bool = True
+    # replace connections older than this many seconds (-1 to never recycle;
+    # postgres only)
+    DB_POOL_RECYCLE: int = -1
+    # abort statements that run longer than this many milliseconds (postgres only)
+    DB_STATEMENT_TIMEOUT: int | None = None
+
     @model_validator(mode="after")
     def _check_db_provided(self) -> Self:
         if not self.DB_SQLITE_PATH:
@@ -87,6 +122,14 @@ class Settings(BaseSettings):
                     "Either DB_SQLITE_PATH or POSTGRES_SERVER and POSTGRES_USER "
                     "environment variables must be set"
                 )
+        if self.ASYNC_DB and self.DB_SQLITE_PATH == ":memory:":
+            # the async engine would open its own, separate in-memory database
+            raise ValueError("ASYNC_DB requires DB_SQLITE_PATH to be a file")
+        if self.DB_SNAPSHOT:
+            if not self.READ_ONLY or self.ASYNC_DB:
+                raise ValueError("DB_SNAPSHOT requires READ_ONLY, and not ASYNC_DB")
+            if not self.DB_SQLITE_PATH or self.DB_SQLITE_PATH == ":memory:":
+                raise ValueError("DB_SNAPSHOT requires DB_SQLITE_PATH to be a file")
         return self
 
     # my stuff
@@ -94,5 +137,18 @@ class Settings(BaseSettings):
     # Whether database is read-only. If True, no changes will be made to the database.
     READ_ONLY: bool = False
 
+    # For READ_ONLY deployments backed by a sqlite file (e.g. public mirrors),
+    # serve from an immutable snapshot rather than the live database:
+    # - "memory": copy the file into an in-memory database in each worker process
+    # - "immutable": open the file with `immutable=1` (no locking, no change checks)
+    # Either way, sqlite itself refuses writes, so statements aren't inspected.
+    DB_SNAPSHOT: Literal["memory", "immutable"] | None = None
+
+    # Maximum number of rows held in the process-wide identity cache used by
+    # `Model.objects.get` (0 disables the cache), and how long (in seconds)
+    # a cached row may be served before it is re-read from the database.
+    IDENTITY_CACHE_SIZE: int = 0
+    IDENTITY_CACHE_TTL: float = 300
+
 
 settings = Settings()
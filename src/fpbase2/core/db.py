@@ -1,33 +1,190 @@
-from collections.abc import Iterator
+import os
+import sqlite3
+from collections.abc import AsyncIterator, Generator
+from contextlib import closing
+from typing import Any, Literal
 
+from fastapi import Request
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool
 from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
-from fpbase2.core.config import settings
+from fpbase2.core.config import settings, to_async_uri
+
+from .utils import make_engine_read_only
+
+# requests with these methods are served from the read replica (if configured)
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+# Pragmas applied to every new connection to a file-backed sqlite database.
+# In WAL mode, readers don't block the (single) writer and vice versa, so a
+# pool of connections can serve concurrent requests.
+SQLITE_PRAGMAS: dict[str, str | int] = {
+    "journal_mode": "WAL",
+    # in WAL mode, NORMAL is durable against application crashes and only
+    # syncs at checkpoints (rather than on every commit)
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024**2,  # bytes
+    "cache_size": -64 * 1024,  # negative: KiB, per connection
+    "busy_timeout": 5000,  # ms to wait for a lock before raising
+}
+
+
+def is_memory_sqlite(uri: str) -> bool:
+    """Return True if `uri` refers to an in-memory sqlite database."""
+    database = uri.partition("://")[2].lstrip("/")
+    return not database or ":memory:" in database or "mode=memory" in database
+
+
+def engine_kwargs(uri: str) -> dict[str, Any]:
+    """Return `create_engine` keyword arguments for `uri`, based on `settings`."""
+    if uri.startswith("sqlite"):
+        # Allow sqlite connections to be used across threads
+        kwargs: dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+        if is_memory_sqlite(uri):
+            # An in-memory database only exists within a single connection.
+            # The StaticPool class is designed for situations where you need a
+            # simple connection pool that maintains a single connection for all
+            # requests. This pool does not support multiple connections and does
+            # not close the connection until the process ends.
+            kwargs["poolclass"] = StaticPool
+        else:
+            kwargs["pool_size"] = settings.DB_POOL_SIZE
+            kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+            kwargs["pool_timeout"] = settings.DB_POOL_TIMEOUT
+        return kwargs
+
+    kwargs = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if settings.DB_STATEMENT_TIMEOUT is not None:
+        # set as a server option on each new connection (libpq `options`)
+        timeout = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"
+        kwargs["connect_args"] = {"options": timeout}
+    return kwargs
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, _: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def make_engine(uri: str) -> Engine:
+    """Create an engine for `uri`, configured from `settings`."""
+    new_engine = create_engine(uri, echo=settings.DEBUG, **engine_kwargs(uri))
+    if uri.startswith("sqlite") and not is_memory_sqlite(uri):
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+def make_async_engine(uri: str) -> AsyncEngine:
+    """Create an async engine for `uri` (see `make_engine`)."""
+    uri = to_async_uri(uri)
+    new_engine = create_async_engine(uri, echo=settings.DEBUG, **engine_kwargs(uri))
+    if uri.startswith("sqlite") and not is_memory_sqlite(uri):
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+def _set_query_only(dbapi_connection: Any, _: Any) -> None:
+    dbapi_connection.execute("PRAGMA query_only=ON")
+
+
+# open connections holding in-memory snapshot databases (see make_snapshot_engine)
+_snapshots: dict[str, sqlite3.Connection] = {}
+
+
+def make_snapshot_engine(
+    path: str, mode: Literal["memory", "immutable"] = "memory"
+) -> Engine:
+    """Create a read-only engine serving a snapshot of the sqlite file at `path`.
+
+    In "memory" mode the file is copied (using the sqlite backup API) into a
+    shared-cache in-memory database private to this process, and then never read
+    again. In "immutable" mode the file is opened with `immutable=1`, which tells
+    sqlite that it cannot change, so no locks are taken and no change detection
+    is done. In both cases, writes are refused by sqlite itself, and the engine
+    pools connections (sized by the `DB_POOL_*` settings) for concurrent reads.
+    """
+    pool_kwargs: dict[str, Any] = {
+        "poolclass": QueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+    if mode == "immutable":
+        return create_engine(
+            f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true",
+            echo=settings.DEBUG,
+            connect_args={"check_same_thread": False},
+            **pool_kwargs,
+        )
+
+    # an in-memory database only lives as long as a connection to it is open,
+    # so the connection that receives the snapshot is kept open.
+    name = f"file:fpbase-snapshot-{os.getpid()}-{len(_snapshots)}"
+    name += "?mode=memory&cache=shared"
+    _snapshots[name] = sqlite3.connect(name, uri=True, check_same_thread=False)
+    with closing(sqlite3.connect(f"file:{path}?mode=ro", uri=True)) as source:
+        source.backup(_snapshots[name])
+
+    def _connect() -> sqlite3.Connection:
+        return sqlite3.connect(name, uri=True, check_same_thread=False)
+
+    # (the default for "sqlite://" would be a SingletonThreadPool, which closes
+    # the connections of all but `pool_size` threads, even while they're in use)
+    new_engine = create_engine(
+        "sqlite://", echo=settings.DEBUG, creator=_connect, **pool_kwargs
+    )
+    event.listen(new_engine, "connect", _set_query_only)
+    return new_engine
+
 
 # The `engine` is the core interface to the database,
 # responsible for managing the connection pool and serving as the gateway for
 # executing SQL commands. It translates high-level SQLAlchemy commands into
 # database-specific SQL and routes them to the database, returning results.
-engine = create_engine(
-    str(settings.SQLALCHEMY_DATABASE_URI),
-    echo=settings.DEBUG,
-    # Allow sqlite connections to be used across threads
-    connect_args={"check_same_thread": False} if settings.DB_SQLITE_PATH else {},
-    # The StaticPool class is designed for situations where you need a simple
-    # connection pool that maintains a single connection for all requests.
-    # This pool does not support multiple connections and does not close the
-    # connection until the process ends.
-    poolclass=StaticPool if settings.DB_SQLITE_PATH else None,
-)
-
-if settings.READ_ONLY:
-    from .utils import make_engine_read_only
+if settings.DB_SNAPSHOT and settings.DB_SQLITE_PATH:
+    engine = make_snapshot_engine(settings.DB_SQLITE_PATH, settings.DB_SNAPSHOT)
+else:
+    engine = make_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+
+# Engine for read-only requests. This is the primary engine unless a read
+# replica is configured, in which case writes to it are refused.
+read_engine: Engine = engine
+if _replica := settings.DB_READ_REPLICA_URI:
+    read_engine = make_engine(_replica)
+    make_engine_read_only(read_engine)
 
+# The async engines are only created when async routes are enabled, since they
+# need an async driver (aiosqlite or psycopg) to be installed.
+async_engine: AsyncEngine | None = None
+async_read_engine: AsyncEngine | None = None
+if settings.ASYNC_DB:
+    async_engine = make_async_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI)
+    async_read_engine = async_engine
+    if _replica:
+        async_read_engine = make_async_engine(_replica)
+        make_engine_read_only(async_read_engine.sync_engine)
+
+# (snapshot engines are already read-only at the sqlite level)
+if settings.READ_ONLY and not settings.DB_SNAPSHOT:
     make_engine_read_only(engine)
+    if async_engine is not None:
+        make_engine_read_only(async_engine.sync_engine)
 
 
-def get_session() -> Iterator[Session]:
+def get_session(request: Request) -> Generator[Session, None, None]:
     """Yield a session to the caller, and close it when the caller is done.
 
     A Session manages a "unit of work" with the database. It tracks all changes
@@ -35,8 +192,23 @@ def get_session() -> Iterator[Session]:
     appropriate time. It also provides a transactional scope for the changes.
 
     This function is usually used with dependency injection to provide a session.
+    Read-only (e.g. GET) requests are bound to the read replica, if configured.
+    """
+    bind = read_engine if request.method in READ_METHODS else engine
+    with Session(bind) as session:
+        yield session
+
+
+async def get_async_session(request: Request) -> AsyncIterator[AsyncSession]:
+    """Async version of `get_session`, for use with async routes.
+
+    Objects are not expired on commit, since accessing expired attributes would
+    require (implicit) IO, which isn't possible outside of an `await`.
     """
-    with Session(engine) as session:
+    if async_engine is None or async_read_engine is None:
+        raise RuntimeError("Async database access requires settings.ASYNC_DB")
+    bind = async_read_engine if request.method in READ_METHODS else async_engine
+    async with AsyncSession(bind, expire_on_commit=False) as session:
         yield session
 
 
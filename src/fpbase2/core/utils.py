@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Any
 
 from sqlalchemy import Engine
@@ -19,7 +20,16 @@ MODIFYING_KEYWORDS: dict[str, list[str]] = {
     "update": [],
 }
 
+# statements that put a new connection in read-only mode, by dialect name
+_NATIVE_READ_ONLY: dict[str, str] = {
+    "sqlite": "PRAGMA query_only = ON",
+    "postgresql": "SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY",
+}
+
 
+# SQLAlchemy caches compiled statements, so the same few statement strings are
+# executed over and over: remember the verdict for each of them.
+@lru_cache(maxsize=2048)
 def can_modify_database(statement: str) -> bool:
     """Return True if a SQL statement can potentially modify the database."""
     statement = statement.lower().strip()
@@ -43,11 +53,44 @@ def can_modify_database(statement: str) -> bool:
     return False
 
 
-def make_engine_read_only(engine: Engine) -> None:
-    """Make an SQLAlchemy engine read-only."""
+def _set_read_only(dbapi_connection: Any, statement: str) -> None:
+    """Execute `statement` on a new DBAPI connection, outside of any transaction.
+
+    A session-level SET executed in the transaction the driver implicitly opens
+    (e.g. psycopg, with autocommit off) would be reverted by the rollback when the
+    connection is returned to the pool, so autocommit is enabled around it.
+    """
+    autocommit = getattr(dbapi_connection, "autocommit", None)
+    if autocommit is False:
+        dbapi_connection.autocommit = True
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute(statement)
+        cursor.close()
+    finally:
+        if autocommit is False:
+            dbapi_connection.autocommit = False
+
+
+def make_engine_read_only(engine: Engine, native: bool = True) -> None:
+    """Make an SQLAlchemy engine read-only.
+
+    If `native` is True and the database supports it, every connection is put in
+    the database's own read-only mode (`PRAGMA query_only` for sqlite, read-only
+    transactions for postgres), which costs nothing per statement. Otherwise,
+    each statement is checked with `can_modify_database` before it is executed.
+    """
     from sqlalchemy import event
     from sqlalchemy.exc import StatementError
 
+    if native and (read_only := _NATIVE_READ_ONLY.get(engine.dialect.name)):
+
+        @event.listens_for(engine, "connect")
+        def connect(dbapi_connection: Any, *_: Any) -> None:
+            _set_read_only(dbapi_connection, read_only)
+
+        return
+
     @event.listens_for(engine, "before_cursor_execute", retval=False)
     def before_cursor_execute(
         conn: Any, cursor: Any, statement: str, parameters: Any, *_: Any, **__: Any
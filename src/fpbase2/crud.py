@@ -1,9 +1,43 @@
 # just a note to self.
 # most fastapi projects have a crud.py
 # i've put the query stuff in core/_query.py
-from sqlmodel import Session
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING, Any
 
-from fpbase2.models.protein import Protein, ProteinCreate
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, col, select
+
+from fpbase2.models.protein import (
+    NAME_INDEX,
+    SEQ_INDEX,
+    BulkItemError,
+    Protein,
+    ProteinBulkRead,
+    ProteinCreate,
+    ProteinIdentifier,
+    ProteinRead,
+    ProteinSimilarityQuery,
+    ProteinSimilarityRead,
+    ProteinSuggestion,
+    SimilarProtein,
+    identifier_rows,
+)
+from fpbase2.utils.fulltext import search_statement
+from fpbase2.utils.session import create_objects
+from fpbase2.utils.similarity import SimilarityIndex
+from fpbase2.utils.text import seq_digest, slugify
+
+if TYPE_CHECKING:
+    from sqlmodel.sql.expression import SelectOfScalar
+
+# fields that must be unique across all proteins (the slug is derived from name)
+UNIQUE_FIELDS = ("slug", "genbank", "uniprot", "ipg_id")
+# most proteins created by one bulk request (their ids are refreshed in one query)
+MAX_BULK_PROTEINS = 1000
+
+# percent-identity search over the sequences held by the k-mer index
+SIMILARITY_INDEX = SimilarityIndex(SEQ_INDEX)
 
 
 def create_protein(*, session: Session, protein_in: ProteinCreate) -> Protein:
@@ -12,3 +46,257 @@ def create_protein(*, session: Session, protein_in: ProteinCreate) -> Protein:
     session.commit()
     session.refresh(db_item)
     return db_item
+
+
+def create_proteins(
+    *, session: Session, proteins_in: Sequence[Any], batch_size: int = 500
+) -> ProteinBulkRead:
+    """Validate and create many proteins in a single transaction.
+
+    Items that fail validation, that would violate a unique constraint (either
+    against existing rows or against another item in the same batch), or that
+    refer to a row that doesn't exist, are skipped and reported in `errors` by
+    their index in `proteins_in`.
+    """
+    result = ProteinBulkRead()
+    valid: dict[int, ProteinCreate] = {}
+    for i, item in enumerate(proteins_in):
+        try:
+            valid[i] = ProteinCreate.model_validate(item)
+        except ValidationError as e:
+            err = BulkItemError(index=i, detail=e.errors(include_url=False))
+            result.errors.append(err)
+
+    for find_errors in (_unique_conflicts, _missing_references):
+        for i, msg in find_errors(session, valid).items():
+            result.errors.append(BulkItemError(index=i, detail=msg))
+            del valid[i]
+    result.errors.sort(key=lambda e: e.index)
+
+    created = create_objects(session, Protein, list(valid.values()), batch_size)
+    result.created = [ProteinRead.model_validate(obj) for obj in created]
+    return result
+
+
+def _unique_conflicts(
+    session: Session, proteins: dict[int, ProteinCreate]
+) -> dict[int, str]:
+    """Return {index: message} for proteins that would violate a unique field.
+
+    Costs one query per unique field, regardless of the number of proteins.
+    """
+    conflicts: dict[int, str] = {}
+    for field in UNIQUE_FIELDS:
+        first_seen: dict[Any, int] = {}
+        for i, protein in proteins.items():
+            if field == "slug":
+                value = slugify(protein.name)
+            elif (value := getattr(protein, field)) is None:
+                continue
+            if value in first_seen:
+                msg = f"{field} {value!r} duplicates item {first_seen[value]}"
+                conflicts.setdefault(i, msg)
+            else:
+                first_seen[value] = i
+
+        if not first_seen:
+            continue
+        column = getattr(Protein, field)
+        for value in session.exec(select(column).where(column.in_(first_seen))):
+            msg = f"Protein with {field} {value!r} already exists"
+            conflicts.setdefault(first_seen[value], msg)
+    return conflicts
+
+
+def _missing_references(
+    session: Session, proteins: dict[int, ProteinCreate]
+) -> dict[int, str]:
+    """Return {index: message} for proteins with a foreign key to no existing row.
+
+    Costs one query per foreign key set on any of the proteins.
+    """
+    missing: dict[int, str] = {}
+    for fk in Protein.__table__.foreign_keys:  # type: ignore [attr-defined]
+        field = fk.parent.name
+        if field not in ProteinCreate.model_fields:
+            continue
+        values = {
+            i: value
+            for i, protein in proteins.items()
+            if (value := getattr(protein, field)) is not None
+        }
+        if not values:
+            continue
+        target = fk.column
+        statement = select(target).where(target.in_(set(values.values())))
+        found = set(session.exec(statement))
+        for i, value in values.items():
+            if value not in found:
+                msg = f"{field} {value!r} refers to no {target.table.name}"
+                missing.setdefault(i, msg)
+    return missing
+
+
+def _ensure_seq_index(session: Session) -> None:
+    """Build `SEQ_INDEX` from the database, if it hasn't been built yet."""
+    if not SEQ_INDEX.built:
+        seqs = select(Protein.id, Protein.seq).where(col(Protein.seq).is_not(None))
+        SEQ_INDEX.build(session.exec(seqs))  # type: ignore [arg-type]
+
+
+def search_proteins(
+    *, session: Session, query: str, limit: int = 100, offset: int = 0
+) -> Sequence[Protein]:
+    """Return proteins matching all words in `query` (by name, alias, or blurb).
+
+    Results are ranked by relevance, with matches in names weighted highest.
+    """
+    dialect = session.get_bind().dialect.name
+    if (statement := search_statement(Protein, query, dialect)) is None:
+        return []
+    return session.exec(statement.offset(offset).limit(limit)).all()
+
+
+def autocomplete_proteins(
+    *, session: Session, query: str, limit: int = 10
+) -> list[ProteinSuggestion]:
+    """Return proteins with a name or alias starting with `query` (allowing a typo).
+
+    Served from the in-memory `NAME_INDEX` (built from the database on first
+    use), so no query is made once the index is built.
+    """
+    if not NAME_INDEX.built:
+        rows = session.exec(select(Protein.id, Protein.name, Protein.aliases))
+        names = ((pk, [name, *(aliases or [])]) for pk, name, aliases in rows)
+        NAME_INDEX.build(names)  # type: ignore [arg-type]
+    return [
+        ProteinSuggestion(id=s.key, name=s.name, match=s.match)
+        for s in NAME_INDEX.search(query, limit)
+    ]
+
+
+def _proteins_by_id(session: Session, ids: Iterable[int]) -> dict[int, Protein]:
+    statement = select(Protein).where(col(Protein.id).in_(ids))
+    return {p.id: p for p in session.exec(statement)}  # type: ignore [misc]
+
+
+def search_proteins_by_seq(
+    *, session: Session, query: str, limit: int = 100
+) -> Sequence[Protein]:
+    """Return proteins whose sequence contains `query` (`X` matches any residue).
+
+    Candidates are found with the in-memory k-mer index (`SEQ_INDEX`), which is
+    built from the database on first use, so only matching rows are loaded.
+    """
+    _ensure_seq_index(session)
+    if not (ids := SEQ_INDEX.search(query, limit)):
+        return []
+    proteins = _proteins_by_id(session, ids)
+    return [proteins[i] for i in ids if i in proteins]
+
+
+def similar_proteins(
+    *, session: Session, query: ProteinSimilarityQuery
+) -> list[ProteinSimilarityRead]:
+    """Return the proteins most similar to each of the query sequences.
+
+    All queries are scored against the same in-memory sequence matrix, and the
+    proteins for all hits are loaded with a single query.
+    """
+    _ensure_seq_index(session)
+    results = SIMILARITY_INDEX.search(query.seqs, query.top, query.band)
+    proteins = _proteins_by_id(session, {hit.key for hits in results for hit in hits})
+    return [
+        ProteinSimilarityRead(
+            query=seq,
+            hits=[
+                SimilarProtein(
+                    identity=round(hit.identity, 2),
+                    protein=ProteinRead.model_validate(proteins[hit.key]),
+                )
+                for hit in hits
+                if hit.key in proteins
+            ],
+        )
+        for seq, hits in zip(query.seqs, results, strict=True)
+    ]
+
+
+def proteins_by_seq(*, session: Session, seq: str) -> Sequence[Protein]:
+    """Return proteins with exactly the sequence `seq` (after normalization)."""
+    if (digest := seq_digest(seq)) is None:
+        return []
+    statement = select(Protein).where(Protein.seq_digest == digest)
+    return session.exec(statement.order_by(col(Protein.id))).all()
+
+
+def same_seq_statement(protein: Protein) -> "SelectOfScalar[int] | None":
+    """Return a query for the ids of other proteins with `protein`'s sequence.
+
+    None if `protein` has no sequence (so there is nothing to look up).
+    """
+    if protein.seq_digest is None:
+        return None
+    pk = col(Protein.id)
+    statement = select(pk).where(
+        Protein.seq_digest == protein.seq_digest, pk != protein.id
+    )
+    return statement.order_by(pk)  # type: ignore [return-value]
+
+
+def same_seq_ids(*, session: Session, protein: Protein) -> list[int]:
+    """Return the ids of other proteins with the same sequence as `protein`."""
+    if (statement := same_seq_statement(protein)) is None:
+        return []
+    return list(session.exec(statement).all())
+
+
+def backfill_seq_digests(*, session: Session, batch_size: int = 1000) -> int:
+    """Compute `seq_digest` for proteins that have a (non-empty) sequence but no digest.
+
+    Proteins are processed in batches of `batch_size` (by id), rows are updated
+    by primary key (without touching `modified`), and each batch is committed.
+    Sequences without residues (e.g. only `*`) keep no digest. Returns the number
+    of rows updated.
+    """
+    missing = (
+        select(Protein.id, Protein.seq)
+        .where(col(Protein.seq) != "", col(Protein.seq_digest).is_(None))
+        .order_by(col(Protein.id))
+        .limit(batch_size)
+    )
+    count, last_id = 0, None
+    while rows := session.exec(
+        missing if last_id is None else missing.where(col(Protein.id) > last_id)
+    ).all():
+        digests = ((pk, seq_digest(seq)) for pk, seq in rows)
+        if values := [{"id": pk, "seq_digest": d} for pk, d in digests if d]:
+            # (setting `modified` to itself keeps its `onupdate` from firing)
+            session.execute(update(Protein).values(modified=Protein.modified), values)
+            session.commit()
+        count += len(values)
+        last_id = rows[-1][0]
+    return count
+
+
+def backfill_identifiers(*, session: Session, batch_size: int = 1000) -> int:
+    """Rewrite the `ProteinIdentifier` rows of all proteins from their lists.
+
+    Proteins are processed in batches of `batch_size` (by id), and each batch is
+    committed. Returns the number of identifier rows written.
+    """
+    lists = select(Protein).order_by(col(Protein.id)).limit(batch_size)
+    count, last_id = 0, None
+    while proteins := session.exec(
+        lists if last_id is None else lists.where(col(Protein.id) > last_id)
+    ).all():
+        ids = [p.id for p in proteins]
+        session.execute(
+            delete(ProteinIdentifier).where(col(ProteinIdentifier.protein_id).in_(ids))
+        )
+        if rows := [row for p in proteins for row in identifier_rows(p)]:
+            session.execute(insert(ProteinIdentifier), rows)
+        session.commit()
+        count += len(rows)
+        last_id = ids[-1]
+    return count
@@ -1,16 +1,47 @@
-from collections.abc import Sequence
-from typing import Annotated
+from collections.abc import Callable, Iterator, Sequence
+from typing import Annotated, Any, TypeVar
 
-from fastapi import Depends, FastAPI, Query
+from fastapi import (
+    Body,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRoute
 from sqlmodel import Session, select
 
-from fpbase2.core.db import get_session
-from fpbase2.models.protein import Protein, ProteinCreate, ProteinRead, ProteinUpdate
+from fpbase2 import async_routes, crud
+from fpbase2.core.db import get_session, read_engine
+from fpbase2.models.protein import (
+    Protein,
+    ProteinBulkRead,
+    ProteinCreate,
+    ProteinFilter,
+    ProteinPatch,
+    ProteinRead,
+    ProteinSimilarityQuery,
+    ProteinSimilarityRead,
+    ProteinSuggestion,
+    ProteinUpdate,
+)
 
 from .core.config import settings
-from .utils import create_object, delete_object, read_or_404, update_object
+from .utils import (
+    create_object,
+    delete_object,
+    patch_object,
+    read_or_404,
+    update_object,
+)
+from .utils.conditional import is_conditional, not_modified, validators
+from .utils.export import MEDIA_TYPES, ExportFormat, iter_export, negotiate_format
+from .utils.pagination import CursorKey, Page, count_rows, paginate
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -33,15 +64,45 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[
+            "ETag",
+            "Last-Modified",
+            "X-Next-Cursor",
+            "X-Total-Count",
+            "X-Duplicate-Of",
+        ],
     )
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
+F = TypeVar("F", bound=Callable)
+
+
+def async_alternative(async_endpoint: Callable) -> Callable[[F], F]:
+    """Register `async_endpoint` instead of the decorated route if ASYNC_DB is set.
+
+    Must be applied below the `@app.<method>` decorator.
+    """
+
+    def _decorator(endpoint: F) -> F:
+        if not settings.ASYNC_DB:
+            return endpoint
+        async_endpoint.__doc__ = endpoint.__doc__
+        return async_endpoint  # type: ignore [return-value]
+
+    return _decorator
 
 
 class URL:
     ADMIN = "/admin"
     PROTEINS = "/proteins/"
+    PROTEINS_AUTOCOMPLETE = "/proteins/autocomplete"
+    PROTEINS_BULK = "/proteins/bulk"
+    PROTEINS_BY_SEQ = "/proteins/by-seq"
+    PROTEINS_EXPORT = "/proteins/export"
+    PROTEINS_SEARCH = "/proteins/search"
+    PROTEINS_SEARCH_SEQ = "/proteins/search/seq"
+    PROTEINS_SIMILAR = "/proteins/similar"
     PROTEIN = "/proteins/{protein_id}"
 
 
@@ -51,29 +112,215 @@ class URL:
 
 
 @app.post(URL.PROTEINS, response_model=ProteinRead)
-def create_protein(*, session: SessionDep, protein: ProteinCreate) -> Protein:
-    """Create a new protein."""
-    return create_object(session, Protein, protein)
+@async_alternative(async_routes.create_protein)
+def create_protein(
+    *, session: SessionDep, response: Response, protein: ProteinCreate
+) -> Protein:
+    """Create a new protein.
+
+    If other proteins already have the same sequence, their ids are listed in the
+    `X-Duplicate-Of` response header (the protein is still created).
+    """
+    db_protein = create_object(session, Protein, protein)
+    if duplicates := crud.same_seq_ids(session=session, protein=db_protein):
+        response.headers["X-Duplicate-Of"] = ",".join(map(str, duplicates))
+    return db_protein
+
+
+@app.post(URL.PROTEINS_BULK, response_model=ProteinBulkRead)
+def create_proteins(
+    *,
+    session: SessionDep,
+    proteins: Annotated[list[dict[str, Any]], Body(max_length=crud.MAX_BULK_PROTEINS)],
+) -> ProteinBulkRead:
+    """Create many proteins in a single transaction.
+
+    Each item is validated as a `ProteinCreate`. Invalid items (and items that
+    would duplicate an existing protein, or that refer to a missing reference)
+    are skipped and reported in `errors`, while all other items are created.
+    At most `crud.MAX_BULK_PROTEINS` items may be sent in one request.
+    """
+    return crud.create_proteins(session=session, proteins_in=proteins)
 
 
 @app.get(URL.PROTEINS, response_model=list[ProteinRead])
+@async_alternative(async_routes.read_proteins)
 def read_proteins(
     *,
     session: SessionDep,
+    request: Request,
+    response: Response,
+    offset: int = 0,
+    limit: int = Query(default=100, ge=1, le=100),
+    cursor: str | None = None,
+    order_by: CursorKey = "id",
+    filters: Annotated[ProteinFilter, Depends()],
+    count: bool = False,
+) -> Sequence[Protein] | Response:
+    """Return all proteins in the database (paginated).
+
+    When a page is full, the `X-Next-Cursor` response header holds an opaque
+    cursor that may be passed back as `cursor` to fetch the following page.
+    Unlike `offset`, cursor pages are found with an index seek, so deep pages are
+    as cheap as the first one.
+
+    The other parameters filter proteins by attribute (all given filters must
+    match); `alias` and `pdb` select the proteins with that alias or PDB id. With
+    `count=true`, the number of proteins matching the filters (across all pages)
+    is returned in the `X-Total-Count` header.
+
+    Responses carry an `ETag` header (covering the ids and `modified` times of
+    the page); `If-None-Match` requests for an unchanged page are answered with
+    `304 Not Modified`. Pages have no `Last-Modified`, since deleted or filtered
+    out rows would not change it.
+    """
+    where = filters.clauses()
+    page: Page = {
+        "limit": limit,
+        "offset": offset,
+        "cursor": cursor,
+        "order_by": order_by,
+        "where": where,
+    }
+    extra: dict[str, str] = {}
+    if count:
+        extra["X-Total-Count"] = str(count_rows(session, Protein, where))
+    if is_conditional(request, last_modified=False):
+        # check freshness using only the ids and timestamps of the page
+        stamps, next_cursor = paginate(
+            session, Protein, **page, entities=(Protein.id, Protein.modified)
+        )
+        headers = {**validators(stamps, last_modified=False), **extra}
+        if next_cursor is not None:
+            headers["X-Next-Cursor"] = next_cursor
+        if not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+    proteins, next_cursor = paginate(session, Protein, **page)
+    response.headers.update(validators(proteins, last_modified=False))
+    response.headers.update(extra)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return proteins
+
+
+@app.get(URL.PROTEINS_EXPORT, response_class=StreamingResponse)
+def export_proteins(
+    *,
+    format: ExportFormat | None = None,
+    accept: Annotated[str | None, Header()] = None,
+) -> StreamingResponse:
+    """Stream all proteins as NDJSON, CSV, or FASTA.
+
+    The format is taken from the `format` query parameter if given, otherwise
+    from the `Accept` header (defaulting to NDJSON).
+    """
+    fmt = format or negotiate_format(accept)
+
+    # the request session is closed before a streaming response is sent,
+    # so the stream uses its own session.
+    def _stream() -> Iterator[str]:
+        with Session(read_engine) as session:
+            yield from iter_export(session, Protein, ProteinRead, fmt)
+
+    return StreamingResponse(_stream(), media_type=MEDIA_TYPES[fmt])
+
+
+@app.get(URL.PROTEINS_AUTOCOMPLETE, response_model=list[ProteinSuggestion])
+def autocomplete_proteins(
+    *,
+    session: SessionDep,
+    q: str = Query(min_length=1, max_length=128),
+    limit: int = Query(default=10, ge=1, le=50),
+) -> list[ProteinSuggestion]:
+    """Suggest proteins with a name or alias starting with `q`.
+
+    Names are compared in slugified form (case and punctuation are ignored), and
+    if fewer than `limit` proteins match, prefixes with one typo are also tried.
+    """
+    return crud.autocomplete_proteins(session=session, query=q, limit=limit)
+
+
+@app.get(URL.PROTEINS_BY_SEQ, response_model=list[ProteinRead])
+def read_proteins_by_seq(
+    *, session: SessionDep, seq: str = Query(min_length=1)
+) -> Sequence[Protein]:
+    """Return proteins with exactly the sequence `seq`.
+
+    Sequences are compared after removing whitespace and stop codons (`*`), and
+    ignoring case.
+    """
+    return crud.proteins_by_seq(session=session, seq=seq)
+
+
+@app.get(URL.PROTEINS_SEARCH, response_model=list[ProteinRead])
+def search_proteins(
+    *,
+    session: SessionDep,
+    q: str = Query(min_length=1, max_length=256),
     offset: int = 0,
-    limit: int = Query(default=100, lte=100),
+    limit: int = Query(default=100, ge=1, le=100),
 ) -> Sequence[Protein]:
-    """Return all proteins in the database (paginated)."""
-    return session.exec(select(Protein).offset(offset).limit(limit)).all()
+    """Search proteins by name, alias, and description, best matches first.
+
+    All words in `q` must match (as prefixes of words in the protein's text).
+    """
+    return crud.search_proteins(session=session, query=q, limit=limit, offset=offset)
+
+
+@app.get(URL.PROTEINS_SEARCH_SEQ, response_model=list[ProteinRead])
+def search_proteins_by_seq(
+    *,
+    session: SessionDep,
+    q: str = Query(min_length=1, max_length=2048, pattern="^[A-Za-z]+$"),
+    limit: int = Query(default=100, ge=1, le=100),
+) -> Sequence[Protein]:
+    """Return proteins whose sequence contains the peptide or motif `q`.
+
+    In `q`, `X` matches any residue (e.g. `TXXGXG`). Matching is case-insensitive.
+    """
+    return crud.search_proteins_by_seq(session=session, query=q, limit=limit)
+
+
+@app.post(URL.PROTEINS_SIMILAR, response_model=list[ProteinSimilarityRead])
+def similar_proteins(
+    *, session: SessionDep, query: ProteinSimilarityQuery
+) -> list[ProteinSimilarityRead]:
+    """Return the `top` proteins most similar to each sequence in `seqs`.
+
+    Similarity is the percent identity of an ungapped alignment, in which the
+    query may be shifted by up to `band` residues relative to each protein.
+    Send many sequences in one request to amortize the cost of the search.
+    """
+    return crud.similar_proteins(session=session, query=query)
 
 
 @app.get(URL.PROTEIN, response_model=ProteinRead)
-def read_protein(*, session: SessionDep, protein_id: int) -> Protein:
-    """Return a protein by ID."""
-    return read_or_404(session, Protein, protein_id)
+@async_alternative(async_routes.read_protein)
+def read_protein(
+    *, session: SessionDep, request: Request, response: Response, protein_id: int
+) -> Protein | Response:
+    """Return a protein by ID.
+
+    Responses carry `ETag` and `Last-Modified` headers; conditional requests for
+    an unchanged protein are answered with `304 Not Modified`.
+    """
+    if is_conditional(request):
+        # check freshness without loading the whole protein
+        stmt = select(Protein.id, Protein.modified).where(Protein.id == protein_id)
+        if (stamp := session.exec(stmt).first()) is None:
+            raise HTTPException(status_code=404, detail="Protein not found")
+        headers = validators([stamp])  # type: ignore [list-item]
+        if not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+
+    protein = read_or_404(session, Protein, protein_id)
+    response.headers.update(validators([protein]))
+    return protein
 
 
 @app.put(URL.PROTEIN, response_model=ProteinRead)
+@async_alternative(async_routes.update_protein)
 def update_protein(
     *, session: SessionDep, protein_id: int, protein: ProteinUpdate
 ) -> Protein:
@@ -81,7 +328,18 @@ def update_protein(
     return update_object(session, Protein, protein_id, protein)
 
 
+@app.patch(URL.PROTEIN, response_model=ProteinRead)
+@async_alternative(async_routes.patch_protein)
+def patch_protein(
+    *, session: SessionDep, protein_id: int, protein: ProteinPatch
+) -> ProteinRead:
+    """Update some fields of a protein by ID (only those given in the body)."""
+    row = patch_object(session, Protein, protein_id, protein)
+    return ProteinRead.model_validate(row)
+
+
 @app.delete(URL.PROTEIN)
+@async_alternative(async_routes.delete_protein)
 def delete_protein(*, session: SessionDep, protein_id: int) -> dict:
     """Delete a protein by ID."""
     return delete_object(session, Protein, protein_id)
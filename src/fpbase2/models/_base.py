@@ -35,6 +35,9 @@ class FPBaseModel(SQLModel):
     objects: ClassVar[Manager[Self]] = Manager()
 
     def save(self) -> Self:
+        if (batch := Manager._batch_.get()) is not None:
+            batch.add(self)
+            return self
         session = type(self).objects._session
         session.add(self)
         try:
@@ -48,6 +51,9 @@ class FPBaseModel(SQLModel):
         return self
 
     def delete(self) -> None:
+        if (batch := Manager._batch_.get()) is not None:
+            batch.delete(self)
+            return
         session = type(self).objects._session
         session.delete(self)
         try:
@@ -58,6 +64,34 @@ class FPBaseModel(SQLModel):
         finally:
             session.refresh(self)
 
+    # hooks for statements that change rows without loading them (such as
+    # `QueryManager.update` and `delete`), bypassing the ORM events of objects.
+    # overrides must call these too, which keep the identity cache current.
+
+    @classmethod
+    def _before_bulk_update(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """Return the values to set in a bulk update of `values`."""
+        return values
+
+    @classmethod
+    def _after_bulk_update(
+        cls,
+        session: orm.Session,
+        ids: Sequence[Any],
+        values: dict[str, Any],
+        rows: Sequence[Any] | None = None,
+    ) -> None:
+        """Called after rows `ids` were updated with `values` (before commit).
+
+        `rows` are the updated rows, if the statement returned all their columns.
+        """
+        cls.objects._forget_ids([(ident,) for ident in ids], session)
+
+    @classmethod
+    def _after_bulk_delete(cls, session: orm.Session, ids: Sequence[Any]) -> None:
+        """Called after rows `ids` were deleted (before commit)."""
+        cls.objects._forget_ids([(ident,) for ident in ids], session)
+
     # def exists(self) -> bool: ...
     # def update(self, **kwargs: Any) -> Self: ...
 
@@ -74,7 +108,9 @@ class TimeStampedModel(FPBaseModel):
         nullable=False,
         sa_column_kwargs={
             "server_default": text("current_timestamp"),
-            "onupdate": text("current_timestamp"),
+            # use the same (microsecond) precision as the default, so that
+            # `modified` orders consistently, e.g. for keyset pagination
+            "onupdate": _now,
         },
     )
 
@@ -0,0 +1,125 @@
+"""Process-wide identity cache for `Model.objects` lookups.
+
+`Session.get` only consults the identity map of the current session, so every new
+(request) session re-queries frequently used rows. The `IdentityCache` keeps the
+column values of recently fetched rows across sessions, keyed by primary key, along
+with a secondary index from unique column values (e.g. `slug`) to primary keys.
+
+Entries are dropped when a row is updated or deleted through the ORM (see
+`QueryManager._listen_for_changes`) and otherwise expire after `ttl` seconds,
+which bounds staleness from writes made by other processes.
+"""
+
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class IdentityCache:
+    """A thread-safe LRU cache of row values, with per-entry time-to-live.
+
+    Rows are stored under `(model, identity)`, where `identity` is the tuple of
+    primary key values. Unique column values are stored as pointers to the
+    identity, so that `get_by(model, "slug", value)` can be served from the cache
+    too. Values are copied on the way in and out, so callers may mutate them.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _lookup(self, key: tuple) -> Any | None:
+        if (item := self._data.get(key)) is not None:
+            expires, value = item
+            if expires > time.monotonic():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        return None
+
+    def _store(self, key: tuple, value: Any, expires: float) -> None:
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+
+    def get(self, model: type, identity: tuple) -> dict[str, Any] | None:
+        """Return the cached values of the `model` row with primary key `identity`."""
+        with self._lock:
+            values = self._lookup((model, identity))
+            return self._count(values)
+
+    def get_by(self, model: type, column: str, value: Any) -> dict[str, Any] | None:
+        """Return the cached values of the `model` row where `column == value`."""
+        with self._lock:
+            values = None
+            if (identity := self._lookup((model, column, value))) is not None:
+                values = self._lookup((model, identity))
+                # the unique value may have changed since the pointer was stored
+                if values is not None and values.get(column) != value:
+                    values = None
+            return self._count(values)
+
+    def _count(self, values: dict[str, Any] | None) -> dict[str, Any] | None:
+        if values is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return copy.deepcopy(values)
+
+    def set(
+        self,
+        model: type,
+        identity: tuple,
+        values: dict[str, Any],
+        unique: Iterable[str] = (),
+    ) -> None:
+        """Cache `values` for a row, indexed by primary key and `unique` columns."""
+        values = copy.deepcopy(values)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._store((model, identity), values, expires)
+            for column in unique:
+                if values.get(column) is not None:
+                    self._store((model, column, values[column]), identity, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, model: type, identity: tuple) -> None:
+        """Forget the `model` row with primary key `identity`."""
+        with self._lock:
+            self._data.pop((model, identity), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._hits = self._misses = 0
+
+    def cache_info(self) -> CacheInfo:
+        """Report cache statistics (like `functools.lru_cache`)."""
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize, len(self._data))
+
+
+def cache_from_settings() -> IdentityCache | None:
+    from fpbase2.core.config import settings
+
+    if settings.IDENTITY_CACHE_SIZE <= 0:
+        return None
+    return IdentityCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL)
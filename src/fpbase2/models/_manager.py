@@ -1,13 +1,37 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any, Generic, Literal, TypeVar, cast, overload
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cached_property
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Generic,
+    Literal,
+    TypeVar,
+    cast,
+    overload,
+)
 
+from sqlalchemy import Integer, delete, orm, update
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import class_mapper, make_transient_to_detached
+from sqlalchemy.orm.attributes import instance_state
+from sqlalchemy.orm.util import identity_key
 from sqlmodel import Session, SQLModel, func, select
 
+from fpbase2._typed_sa import listens_for, on_after_delete, on_after_update
+from fpbase2.utils.minhash import MinHashLSH
+
+from ._cache import CacheInfo, IdentityCache, cache_from_settings
+
 if TYPE_CHECKING:
-    from collections.abc import Iterator, Sequence
+    from collections.abc import Iterable, Iterator, Sequence
 
-    from sqlalchemy.engine import ScalarResult, TupleResult
+    from sqlalchemy.engine import Connection, ScalarResult, TupleResult
+    from sqlalchemy.orm import Mapper
     from sqlalchemy.sql._typing import _ColumnExpressionArgument
     from sqlmodel.sql.expression import Select, SelectOfScalar
 
@@ -17,6 +41,15 @@ if TYPE_CHECKING:
 
 M = TypeVar("M", bound=SQLModel)
 
+# rounds of random primary keys tried by `QueryManager.random` before it falls back
+# to sorting the table
+RANDOM_ATTEMPTS = 3
+
+# `Session.info` keys: identities to invalidate again when the transaction commits,
+# and whether the transaction has written anything yet
+_STALE = "identity_cache_stale"
+_WRITTEN = "identity_cache_written"
+
 
 class QueryManager(Generic[M]):
     _model: type[M]
@@ -37,6 +70,9 @@ class QueryManager(Generic[M]):
         limit: int | None = None,
         order_by: Any = None,
         where: ColExpression | None = None,
+        load: Any = None,
+        defer: Sequence[Any] = (),
+        only: Sequence[Any] = (),
         exec: Literal[True] = ...,
     ) -> ScalarResult[M]: ...
     @overload
@@ -47,6 +83,9 @@ class QueryManager(Generic[M]):
         limit: int | None = None,
         order_by: Any = None,
         where: ColExpression | None = None,
+        load: Any = None,
+        defer: Sequence[Any] = (),
+        only: Sequence[Any] = (),
         exec: Literal[True] = ...,
     ) -> TupleResult[M]: ...
     @overload
@@ -56,6 +95,9 @@ class QueryManager(Generic[M]):
         limit: int | None = None,
         order_by: Any = None,
         where: ColExpression | None = None,
+        load: Any = None,
+        defer: Sequence[Any] = (),
+        only: Sequence[Any] = (),
         exec: Literal[False] = ...,
     ) -> SelectOfScalar[M]: ...
     @overload
@@ -66,6 +108,9 @@ class QueryManager(Generic[M]):
         limit: int | None = None,
         order_by: Any = None,
         where: ColExpression | None = None,
+        load: Any = None,
+        defer: Sequence[Any] = (),
+        only: Sequence[Any] = (),
         exec: Literal[False] = ...,
     ) -> Select[M]: ...
     def select(
@@ -75,13 +120,32 @@ class QueryManager(Generic[M]):
         limit: int | None = None,
         order_by: Any = None,
         where: ColExpression | None = None,
+        load: Any = None,
+        defer: Sequence[Any] = (),
+        only: Sequence[Any] = (),
         exec: bool = True,
     ) -> SelectOfScalar[M] | Select[M] | TupleResult[M] | ScalarResult[M]:
+        """Select rows (or `entities`) of the model.
+
+        `load` is a loader option (or a tuple of them) for relationships, such as
+        `selectinload(User.proteins_created)`. Columns (or their names) in `defer`
+        are only loaded when accessed, and if `only` is given, all other columns
+        are deferred: use them to skip heavy columns, such as `Protein.seq`.
+        """
         entities = entities or (self._model,)
 
         statement: Select[M] | SelectOfScalar[M]
         statement = select(*entities).select_from(from_ or self._model)
 
+        options: list[Any] = []
+        if load is not None:
+            options.extend(load if isinstance(load, tuple) else (load,))
+        options.extend(orm.defer(self._column(c)) for c in defer)
+        if only:
+            options.append(orm.load_only(*(self._column(c) for c in only)))
+        if options:
+            statement = statement.options(*options)
+
         if where is not None:
             if not isinstance(where, tuple):
                 where = (where,)
@@ -95,12 +159,68 @@ class QueryManager(Generic[M]):
             return self._session.exec(statement)
         return statement
 
+    def _column(self, column: Any) -> Any:
+        return getattr(self._model, column) if isinstance(column, str) else column
+
     def all(self) -> Sequence[M]:
         return self.select(limit=None).all()
 
+    def iter(
+        self,
+        batch_size: int = 1000,
+        where: ColExpression | None = None,
+        order_by: Any = None,
+    ) -> Iterator[M]:
+        """Iterate over rows without loading them all into memory.
+
+        Rows are fetched `batch_size` at a time (with a server-side cursor, where
+        the backend supports one). Once a batch has been iterated over, its
+        objects are removed from the session (unless they were modified), so
+        memory use depends on `batch_size`, not on the number of rows.
+        """
+        statement = self.select(where=where, order_by=order_by, exec=False)
+        statement = statement.execution_options(yield_per=batch_size)
+        session = self._session
+        for batch in session.exec(statement).partitions():
+            yield from batch
+            for obj in batch:
+                if obj in session and not session.is_modified(obj):
+                    session.expunge(obj)
+
+    def in_bulk(self, idents: Iterable[Any], chunk_size: int = 500) -> dict[Any, M]:
+        """Return a dict of the rows with the primary keys in `idents`, by key.
+
+        Keys are looked up `chunk_size` at a time with `IN` queries, after those
+        that are already in the session or the identity cache. Missing keys are
+        left out of the result, which is in the order of `idents`.
+        """
+        (pk,) = class_mapper(self._model).primary_key
+        keys = list(dict.fromkeys(idents))
+        found = {key: obj for key in keys if (obj := self._lookup(key)) is not None}
+        missing = [key for key in keys if key not in found]
+        for i in range(0, len(missing), chunk_size):
+            for obj in self.select(where=pk.in_(missing[i : i + chunk_size])):
+                found[getattr(obj, pk.key)] = obj
+                self._remember(obj)
+        return {key: found[key] for key in keys if key in found}
+
+    def get_many(self, idents: Iterable[Any], raises: bool = True) -> list[M]:
+        """Return the rows with the primary keys in `idents` (in the same order).
+
+        Like `get`, raises a KeyError if any key is missing (or, with
+        `raises=False`, leaves them out).
+        """
+        idents = list(idents)
+        rows = self.in_bulk(idents)
+        if raises and (missing := [i for i in idents if i not in rows]):
+            raise KeyError(
+                f"Cannot find {self._model.__name__} with primary_key(s) {missing}"
+            )
+        return [rows[i] for i in idents if i in rows]
+
     def count(self) -> int:
-        statement = select([func.count()]).select_from(self._model)
-        return cast(int, self._session.exec(statement).one())
+        statement = select(func.count()).select_from(self._model)
+        return self._session.exec(statement).one()
 
     @overload
     def first(self, raises: Literal[True] = True) -> M: ...
@@ -117,10 +237,48 @@ class QueryManager(Generic[M]):
     @overload
     def random(self, n: int) -> Sequence[M]: ...
     def random(self, n: int = 1) -> M | Sequence[M]:
-        result = self.select(limit=n, order_by=func.random())
+        """Return `n` distinct rows chosen uniformly at random (fewer if n > count).
+
+        With an integer primary key, random keys between the smallest and largest
+        are looked up by primary key (retrying for keys that fall in gaps), so the
+        cost depends on `n` and not on the size of the table. Other tables, and
+        tables with very sparse keys, fall back to `ORDER BY random()`.
+        """
+        rows = self._sample(n)
         if n == 1:
-            return result.one()
-        return result.all()
+            if not rows:
+                raise NoResultFound("No row was found when one was required")
+            return rows[0]
+        return rows
+
+    def _sample(self, n: int) -> list[M]:
+        (pk,) = class_mapper(self._model).primary_key
+        found: dict[Any, M] = {}
+        if isinstance(pk.type, Integer):
+            # (separate subqueries, so that each is a single index lookup)
+            bounds = (
+                select(func.min(pk)).scalar_subquery(),
+                select(func.max(pk)).scalar_subquery(),
+            )
+            lo, hi = self._session.exec(select(*bounds)).one()
+            for _ in range(RANDOM_ATTEMPTS if lo is not None else 0):
+                if (wanted := n - len(found)) <= 0:
+                    break
+                # (oversample, since some keys will miss)
+                keys = random.sample(range(lo, hi + 1), min(hi - lo + 1, 2 * wanted))
+                rows = {getattr(o, pk.key): o for o in self.select(where=pk.in_(keys))}
+                for key in keys:
+                    if key in rows and len(found) < n:
+                        found.setdefault(key, rows[key])
+            if lo is None or len(found) == n:
+                return list(found.values())
+
+        rest = self.select(
+            limit=n - len(found),
+            order_by=func.random(),
+            where=pk.not_in(list(found)) if found else None,
+        )
+        return [*found.values(), *rest]
 
     # TODO: Unpack kwargs from ModelCreateType
     @overload
@@ -140,6 +298,10 @@ class QueryManager(Generic[M]):
                 where.extend(self._dict_to_expr(clause))
             else:
                 where.append(clause)
+        if limit == 1 and not where and len(kwargs) == 1 and Manager._cache_:
+            ((column, value),) = kwargs.items()
+            if column in self._unique_columns:
+                return self._get_by_cached(column, value)
         where.extend(self._dict_to_expr(kwargs))
 
         result = self.select(limit=limit, where=tuple(where))
@@ -148,14 +310,23 @@ class QueryManager(Generic[M]):
         return result.all()
 
     def _dict_to_expr(self, d: dict[str, Any]) -> Iterator[SingleExpr]:
-        return (getattr(self._model, k) == v for k, v in d.items())
+        # models may declare `__lookups__`: keywords that map a value to a clause
+        lookups = getattr(self._model, "__lookups__", {})
+        return (
+            lookups[k](v) if k in lookups else getattr(self._model, k) == v
+            for k, v in d.items()
+        )
 
     @overload
     def get(self, ident: Any, raises: Literal[True] = True) -> M: ...
     @overload
     def get(self, ident: Any, raises: Literal[False]) -> M | None: ...
     def get(self, ident: Any, raises: bool = True) -> M | None:
-        if (obj := self._session.get(self._model, ident)) is None:
+        if Manager._cache_:
+            obj = self._get_cached(ident)
+        else:
+            obj = self._session.get(self._model, ident)
+        if obj is None:
             if raises:
                 raise KeyError(
                     f"Cannot find {self._model.__name__} with primary_key '{ident}'"
@@ -171,6 +342,9 @@ class QueryManager(Generic[M]):
 
     def create(self, obj: Any | None = None, **kwargs: Any) -> M:
         db_obj = self._model.model_validate(obj or kwargs)
+        if (batch := Manager._batch_.get()) is not None:
+            batch.add(db_obj)
+            return db_obj
         self._session.add(db_obj)
         try:
             self._session.commit()
@@ -180,25 +354,303 @@ class QueryManager(Generic[M]):
         self._session.refresh(db_obj)
         return db_obj
 
+    def update(self, where: ColExpression | None = None, **values: Any) -> int:
+        """Set `values` on all rows matching `where`, with a single UPDATE.
+
+        Returns the number of rows updated. Rows are not loaded: columns derived
+        from the updated ones (and `modified`) are set by the same statement, as
+        the model declares with `_before_bulk_update`. `where` takes the same
+        clauses as `select`; `None` updates every row.
+        """
+        values = self._model._before_bulk_update(dict(values))  # type: ignore [attr-defined]
+        statement = update(self._model).values(**values)
+        with self._bulk_transaction():
+            ids = self._execute_bulk(statement, where)
+            self._model._after_bulk_update(self._session, ids, values)  # type: ignore [attr-defined]
+        return len(ids)
+
+    def delete(self, where: ColExpression | None = None) -> int:
+        """Delete all rows matching `where` with a single DELETE.
+
+        Returns the number of rows deleted. `where` takes the same clauses as
+        `select`; `None` deletes every row.
+        """
+        with self._bulk_transaction():
+            ids = self._execute_bulk(delete(self._model), where)
+            self._model._after_bulk_delete(self._session, ids)  # type: ignore [attr-defined]
+        return len(ids)
+
+    def _execute_bulk(self, statement: Any, where: ColExpression | None) -> list[Any]:
+        """Execute a bulk UPDATE/DELETE, and return the primary keys of its rows."""
+        if where is not None:
+            statement = statement.where(
+                *(where if isinstance(where, tuple) else (where,))
+            )
+        # ("fetch" also finds matching objects in the session that are expired)
+        statement = statement.execution_options(synchronize_session="fetch")
+        (pk,) = class_mapper(self._model).primary_key
+        dialect = self._session.get_bind().dialect
+        supported = (
+            dialect.update_returning
+            if statement.is_update
+            else dialect.delete_returning
+        )
+        if supported:
+            ids = list(self._session.execute(statement.returning(pk)).scalars())
+        else:
+            # (in the same transaction, just before the statement itself)
+            ids = list(self.select(pk, where=statement.whereclause).all())
+            self._session.execute(statement)
+        return ids
+
+    @contextmanager
+    def _bulk_transaction(self) -> Iterator[None]:
+        if Manager._batch_.get() is not None:
+            yield  # committed (or rolled back) with the batch
+            return
+        try:
+            yield
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+
+    @contextmanager
+    def batch(self, flush_every: int = 500, refresh: bool = False) -> Iterator[Batch]:
+        """Group `save`, `create`, and `delete` calls into a single transaction.
+
+        Inside the block, those calls (on any model) only queue their changes,
+        which are flushed every `flush_every` calls and committed once when the
+        block exits. If the block raises, all of its changes are rolled back.
+        Objects are not refreshed one by one; with `refresh=True`, saved objects
+        are re-read after the commit with one query per model. Nested `batch`
+        blocks are part of the outermost one.
+
+        >>> with Protein.objects.batch(flush_every=1000):
+        ...     for data in rows:
+        ...         Protein.objects.create(data)
+        """
+        if (outer := Manager._batch_.get()) is not None:
+            yield outer
+            return
+
+        session = self._session
+        token = Manager._batch_.set(batch := Batch(session, flush_every))
+        try:
+            yield batch
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            Manager._batch_.reset(token)
+        if refresh:
+            batch.refresh()
+
+    def near_duplicates(
+        self, column: str = "seq", threshold: float = 0.8
+    ) -> list[list[M]]:
+        """Return clusters of rows whose `column` values are nearly identical.
+
+        Uses the MinHash LSH index the model maintains for `column` (declared in
+        `__minhash__`), building it on first use, or else a temporary one. Either
+        way, the cost is roughly linear in the number of rows. `threshold` is the
+        minimum estimated Jaccard similarity of the values' k-mer sets.
+        """
+        index = getattr(self._model, "__minhash__", {}).get(column) or MinHashLSH()
+        (pk,) = class_mapper(self._model).primary_key
+        if not index.built:
+            values = getattr(self._model, column)
+            index.build(
+                self._session.exec(select(pk, values).where(values.is_not(None)))
+            )
+
+        clusters = index.clusters(threshold)
+        ids = [key for cluster in clusters for key in cluster]
+        rows = {getattr(o, pk.key): o for o in self.select(where=pk.in_(ids))}
+        return [[rows[key] for key in cluster if key in rows] for cluster in clusters]
+
+    # identity cache ---------------------------------------------------
+
+    @cached_property
+    def _unique_columns(self) -> set[str]:
+        mapper = class_mapper(self._model)
+        return {c.key for c in mapper.columns if c.unique or c.primary_key}
+
+    def _lookup(self, ident: Any) -> M | None:
+        """Return the object with primary key `ident` if known without a query."""
+        key = identity_key(self._model, ident)
+        # objects already in this session take precedence (they may be modified)
+        if (obj := self._session.identity_map.get(key)) is not None:
+            return obj
+        if (cache := Manager._cache_) and (
+            values := cache.get(self._model, key[1])
+        ) is not None:
+            return self._attach(values)
+        return None
+
+    def _get_cached(self, ident: Any) -> M | None:
+        if (obj := self._lookup(ident)) is not None:
+            return obj
+        if (obj := self._session.get(self._model, ident)) is not None:
+            self._remember(obj)
+        return obj
+
+    def _get_by_cached(self, column: str, value: Any) -> M | None:
+        cache = cast(IdentityCache, Manager._cache_)
+        if (values := cache.get_by(self._model, column, value)) is not None:
+            pk = tuple(values[c.key] for c in class_mapper(self._model).primary_key)
+            key = identity_key(self._model, pk)
+            if (obj := self._session.identity_map.get(key)) is not None:
+                return obj
+            return self._attach(values)
+        where = getattr(self._model, column) == value
+        if (obj := self.select(limit=1, where=where).first()) is not None:
+            self._remember(obj)
+        return obj
+
+    def _attach(self, values: dict[str, Any]) -> M:
+        """Add a row (from cached column values) to the session without querying."""
+        obj = self._model(**values)
+        make_transient_to_detached(obj)
+        return self._session.merge(obj, load=False)
+
+    def _remember(self, obj: M) -> None:
+        session = self._session
+        # rows read after this transaction wrote anything (or with unflushed
+        # changes) may hold values that are never committed
+        if (
+            session.info.get(_WRITTEN)
+            or session.new
+            or session.dirty
+            or session.deleted
+        ):
+            return
+        cache = Manager._cache_
+        if cache and (identity := instance_state(obj).identity) is not None:
+            mapper = class_mapper(self._model)
+            values = {attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs}
+            cache.set(self._model, identity, values, self._unique_columns)
+
+    def _forget(self, _: Mapper, __: Connection, target: M) -> None:
+        if (identity := instance_state(target).identity) is not None:
+            self._forget_ids([identity], orm.object_session(target))
+
+    def _forget_ids(
+        self, identities: Iterable[tuple], session: orm.Session | None = None
+    ) -> None:
+        """Drop rows changed without the ORM (e.g. in bulk) from the cache.
+
+        `identities` are primary key tuples. The rows are dropped now and again
+        when `session` commits, since another session may cache the old values
+        in between.
+        """
+        if cache := Manager._cache_:
+            stale = [(self._model, identity) for identity in identities]
+            for model, identity in stale:
+                cache.invalidate(model, identity)
+            if session is not None:
+                session.info.setdefault(_STALE, set()).update(stale)
+                session.info[_WRITTEN] = True
+
+
+class Batch:
+    """Changes queued by `save`, `create`, and `delete` in `QueryManager.batch`."""
+
+    def __init__(self, session: Session, flush_every: int = 500) -> None:
+        self.session = session
+        self.flush_every = flush_every
+        self.saved: list[SQLModel] = []
+        self._pending = 0
+
+    def add(self, obj: SQLModel) -> None:
+        self.session.add(obj)
+        self.saved.append(obj)
+        self._queued()
+
+    def delete(self, obj: SQLModel) -> None:
+        self.session.delete(obj)
+        self._queued()
+
+    def _queued(self) -> None:
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.session.flush()
+            self._pending = 0
+
+    def refresh(self) -> None:
+        """Re-read all saved (and not deleted) objects, with one query per model."""
+        by_model: dict[type[SQLModel], list[Any]] = {}
+        for obj in self.saved:
+            if (identity := instance_state(obj).identity) is not None:
+                by_model.setdefault(type(obj), []).extend(identity)
+        for model, ids in by_model.items():
+            (pk,) = class_mapper(model).primary_key
+            self.session.exec(
+                select(model)
+                .where(pk.in_(ids))
+                .execution_options(populate_existing=True)
+            ).all()
+
 
 class Manager(Generic[M]):
     # FIXME: figure out better injection logic for session
     _session_: Session | None = None
+    # the `QueryManager.batch` block in progress in this context (thread or task),
+    # if any, so that concurrent requests never share one
+    _batch_: ClassVar[ContextVar[Batch | None]] = ContextVar("batch", default=None)
+    # process-wide identity cache for `get` and unique `where` lookups
+    _cache_: IdentityCache | None = cache_from_settings()
 
     @classmethod
     def set_session(cls, session: Session) -> None:
         cls._session_ = session
 
+    @classmethod
+    def set_cache(cls, cache: IdentityCache | None) -> None:
+        """Set (or disable, with None) the identity cache used by all managers."""
+        cls._cache_ = cache
+
+    @classmethod
+    def cache_info(cls) -> CacheInfo | None:
+        """Return hit/miss statistics for the identity cache (None if disabled)."""
+        return cls._cache_.cache_info() if cls._cache_ else None
+
     def __init__(self) -> None:
-        self._qm: QueryManager[M] | None = None
+        # one query manager for each model class (the descriptor is inherited)
+        self._qms: dict[type[M], QueryManager[M]] = {}
 
     def __get__(self, instance: M | None, owner: type[M]) -> QueryManager[M]:
         if instance is not None:
             raise AttributeError("QueryDescriptor is only accessible from the class")
-        if self._qm is None:
-            self._qm = self._create_query_manager(owner)
-        return self._qm
+        if (qm := self._qms.get(owner)) is None:
+            qm = self._qms[owner] = self._create_query_manager(owner)
+        return qm
 
     def _create_query_manager(self, model: type[M]) -> QueryManager[M]:
         newtype = type(f"{model.__name__}Manager", (QueryManager,), {"_model": model})()
-        return cast(QueryManager[M], newtype)
+        qm = cast(QueryManager[M], newtype)
+        # keep the identity cache consistent with changes made through the ORM
+        on_after_update(model)(qm._forget)
+        on_after_delete(model)(qm._forget)
+        return qm
+
+
+@listens_for(orm.Session, "after_flush")
+def _flushed(session: orm.Session, _: Any) -> None:
+    session.info[_WRITTEN] = True
+
+
+@listens_for(orm.Session, "after_commit")
+def _committed(session: orm.Session) -> None:
+    session.info.pop(_WRITTEN, None)
+    stale = session.info.pop(_STALE, ())
+    if cache := Manager._cache_:
+        for model, identity in stale:
+            cache.invalidate(model, identity)
+
+
+@listens_for(orm.Session, "after_rollback")
+def _rolled_back(session: orm.Session) -> None:
+    session.info.pop(_WRITTEN, None)
+    session.info.pop(_STALE, None)
@@ -1,17 +1,29 @@
+from collections.abc import Callable, Sequence
 from enum import Enum
-from typing import TYPE_CHECKING, Any, ClassVar
+from itertools import chain
+from operator import attrgetter
+from typing import TYPE_CHECKING, Annotated, Any, ClassVar
 
-from sqlmodel import JSON, Column, Field, Relationship, SQLModel
+from pydantic import StringConstraints
+from sqlalchemy import ForeignKey, Integer, delete, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import instance_state
+from sqlmodel import JSON, Column, Field, Index, Relationship, SQLModel, col, select
 
-from fpbase2._typed_sa import on_before_save
-from fpbase2.utils.text import new_unique_id, slugify
+from fpbase2._typed_sa import listens_for, on_before_save
+from fpbase2.utils.autocomplete import AutocompleteIndex
+from fpbase2.utils.fulltext import install_fulltext
+from fpbase2.utils.minhash import MinHashLSH
+from fpbase2.utils.seqindex import KmerIndex
+from fpbase2.utils.text import new_unique_id, new_unique_ids, seq_digest, slugify
 from fpbase2.validators import UNIPROT_REGEX
 
-from ._base import TimeStampedModel
+from ._base import FPBaseModel, TimeStampedModel
 from .user import User
 
 if TYPE_CHECKING:
     from sqlalchemy.engine import Connection
+    from sqlalchemy.sql.elements import ColumnElement
 
 
 UNIQUE: Any = {"sa_column_kwargs": {"unique": True}}
@@ -51,12 +63,12 @@ class SwitchingType(str, Enum):
 class ProteinBase(SQLModel):
     name: str = Field(index=True, max_length=128)
     aliases: list[str] | None = Field(None, sa_column=Column(JSON))
-    agg: OligomerizationTendency | None = None
+    agg: OligomerizationTendency | None = Field(None, index=True)
     seq: str | None = None
     seq_comment: str | None = Field(None, max_length=512)
     seq_validated: bool = False
-    chromophore: str | None = Field(None, max_length=5)
-    cofactor: FluorescenceCofactor | None = None
+    chromophore: str | None = Field(None, index=True, max_length=5)
+    cofactor: FluorescenceCofactor | None = Field(None, index=True)
     switch_type: SwitchingType = SwitchingType.BASIC
     blurb: str | None = Field(None, max_length=512)
     pdb: list[str] | None = Field(None, sa_column=Column(JSON))
@@ -96,11 +108,111 @@ class ProteinUpdate(ProteinBase):
     pass
 
 
+class ProteinPatch(ProteinBase):
+    # every field is optional, but `name` may not be set to null
+    name: str = Field(None, max_length=128)
+
+
+class BulkItemError(SQLModel):
+    index: int
+    detail: Any
+
+
+class ProteinBulkRead(SQLModel):
+    created: list[ProteinRead] = Field(default_factory=list)
+    errors: list[BulkItemError] = Field(default_factory=list)
+
+
+class ProteinSimilarityQuery(SQLModel):
+    seqs: list[Annotated[str, StringConstraints(pattern=r"^[A-Za-z]+$")]] = Field(
+        min_length=1, max_length=100
+    )
+    top: int = Field(10, ge=1, le=100)
+    band: int = Field(0, ge=0, le=20)
+
+
+class SimilarProtein(SQLModel):
+    identity: float
+    protein: ProteinRead
+
+
+class ProteinSimilarityRead(SQLModel):
+    query: str
+    hits: list[SimilarProtein] = Field(default_factory=list)
+
+
+# In-process indexes of protein sequences (for peptide/motif search and for finding
+# near-duplicates) and names (for autocompletion). They are built from the
+# database on first use (see `crud` and `QueryManager.near_duplicates`), and kept
+# current with the changes committed by sessions in this process.
+SEQ_INDEX = KmerIndex()
+SEQ_LSH = MinHashLSH()
+NAME_INDEX = AutocompleteIndex()
+
+
+class ProteinSuggestion(SQLModel):
+    id: int
+    name: str
+    match: str
+
+
+class IdentifierKind(str, Enum):
+    ALIAS = "alias"
+    PDB = "pdb"
+
+
+# the list attribute of Protein that holds the identifiers of each kind
+IDENTIFIER_ATTRS = {IdentifierKind.ALIAS: "aliases", IdentifierKind.PDB: "pdb"}
+
+
+def normalize_identifier(kind: IdentifierKind, value: str) -> str:
+    """PDB ids are case-insensitive (and conventionally uppercase)."""
+    value = value.strip()
+    return value.upper() if kind is IdentifierKind.PDB else value
+
+
+def _identifier_lookup(kind: IdentifierKind) -> Callable[[str], "ColumnElement[bool]"]:
+    def where(value: str) -> "ColumnElement[bool]":
+        ids = select(ProteinIdentifier.protein_id).where(
+            ProteinIdentifier.kind == kind,
+            ProteinIdentifier.value == normalize_identifier(kind, value),
+        )
+        return col(Protein.id).in_(ids)
+
+    return where
+
+
 class Protein(ProteinBase, TimeStampedModel, table=True):
+    __table_args__ = (
+        # supports keyset pagination ordered by modification time
+        Index("ix_protein_modified_id", "modified", "id"),
+        # common combinations of `ProteinFilter` parameters (agg, cofactor, and
+        # chromophore have indexes of their own)
+        Index("ix_protein_switch_type_agg", "switch_type", "agg"),
+        Index("ix_protein_seq_validated_switch_type", "seq_validated", "switch_type"),
+    )
+    # near-duplicate indexes by column, used by `Protein.objects.near_duplicates`
+    __minhash__: ClassVar[dict[str, MinHashLSH]] = {"seq": SEQ_LSH}
+    # `Protein.objects.where` keywords that are not columns
+    __lookups__: ClassVar[dict[str, Callable[[Any], Any]]] = {
+        "alias": _identifier_lookup(IdentifierKind.ALIAS),
+        "pdb": _identifier_lookup(IdentifierKind.PDB),
+    }
+
     id: int | None = Field(default=None, primary_key=True)
     # TODO: allow_mutation = False
-    uuid: str | None = Field(default=None, index=True, max_length=5, **UNIQUE)
+    # always set before insert (see `_allocate_protein_uuids`), so it can match the
+    # rows returned by a multi-row INSERT to the objects (which SQLite needs)
+    uuid: str | None = Field(
+        default=None,
+        index=True,
+        max_length=5,
+        nullable=False,
+        sa_column_kwargs={"unique": True, "insert_sentinel": True},
+    )
     slug: str | None = Field(default=None, **UNIQUE)
+    # digest of the normalized sequence, so exact sequence lookups are index seeks
+    seq_digest: str | None = Field(default=None, index=True, max_length=32)
 
     created_by_id: int | None = Field(default=None, foreign_key="user.id")
     created_by: User | None = Relationship(
@@ -119,5 +231,229 @@ class Protein(ProteinBase, TimeStampedModel, table=True):
     @on_before_save
     def _on_before_save(self, _: Any, conn: "Connection") -> None:
         if self.uuid is None:
-            self.uuid = new_unique_id(conn)
+            column = type(self).__table__.c.uuid  # type: ignore [attr-defined]
+            self.uuid = new_unique_id(conn, column=column)
         self.slug = self.slugified_name()
+        self.seq_digest = seq_digest(self.seq)
+
+    @classmethod
+    def _before_bulk_update(cls, values: dict[str, Any]) -> dict[str, Any]:
+        # the same derived columns as `_on_before_save`, for plain values
+        if "name" in values:
+            if not isinstance(values["name"], str):
+                raise TypeError("`name` must be a string in a bulk update")
+            values["slug"] = slugify(values["name"])
+        if "seq" in values:
+            seq = values["seq"] if isinstance(values["seq"], str) else None
+            values["seq_digest"] = seq_digest(seq)
+        return values
+
+    @classmethod
+    def _after_bulk_update(
+        cls,
+        session: Session,
+        ids: Sequence[Any],
+        values: dict[str, Any],
+        rows: Sequence[Any] | None = None,
+    ) -> None:
+        super()._after_bulk_update(session, ids, values, rows)
+        attrs = {attr for attrs, *_ in _INDEX_FEEDS for attr in attrs}
+        attrs.update(IDENTIFIER_ATTRS.values())
+        if ids and attrs.intersection(values):
+            if rows is None:
+                columns = [getattr(cls, attr) for attr in sorted(attrs)]
+                stmt = select(cls.id, *columns).where(col(cls.id).in_(ids))
+                rows = session.execute(stmt).all()
+            _bulk_changed(session, rows, set(values))
+
+    @classmethod
+    def _after_bulk_delete(cls, session: Session, ids: Sequence[Any]) -> None:
+        super()._after_bulk_delete(session, ids)
+        if ids:
+            _bulk_deleted(session, ids)
+
+
+# full-text search over names, aliases, and blurbs (see `crud.search_proteins`)
+install_fulltext(
+    Protein.__table__,  # type: ignore [attr-defined]
+    {"name": "A", "aliases": "B", "blurb": "C"},
+)
+
+
+class ProteinIdentifier(FPBaseModel, table=True):
+    """One alias or PDB id of a protein (denormalized from the JSON lists).
+
+    Rows are rewritten whenever a protein's `aliases` or `pdb` change, so they can
+    be looked up with an index rather than by scanning the JSON columns.
+    """
+
+    __table_args__ = (Index("ix_proteinidentifier_kind_value", "kind", "value"),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    protein_id: int = Field(
+        sa_column=Column(
+            Integer,
+            ForeignKey(Protein.__table__.c.id, ondelete="CASCADE"),  # type: ignore [attr-defined]
+            index=True,
+            nullable=False,
+        )
+    )
+    kind: IdentifierKind
+    value: str = Field(max_length=128)
+
+
+@listens_for(Session, "before_flush")
+def _allocate_protein_uuids(session: Session, *_: Any) -> None:
+    """Assign uuids to all new proteins in a flush, using a single query.
+
+    Without this, `Protein._on_before_save` would look up a fresh uuid for
+    each inserted row.
+    """
+    new = [p for p in session.new if isinstance(p, Protein) and p.uuid is None]
+    if new:
+        column = Protein.__table__.c.uuid  # type: ignore [attr-defined]
+        uuids = new_unique_ids(len(new), session.connection(), column=column)
+        for protein, uuid in zip(new, uuids, strict=True):
+            protein.uuid = uuid
+
+
+class ProteinFilter(SQLModel):
+    """Query parameters narrowing down a listing of proteins.
+
+    Each parameter that is given must match (they are combined with AND).
+    """
+
+    agg: OligomerizationTendency | None = None
+    switch_type: SwitchingType | None = None
+    cofactor: FluorescenceCofactor | None = None
+    seq_validated: bool | None = None
+    chromophore: str | None = Field(None, max_length=5)
+    alias: str | None = None
+    pdb: str | None = None
+
+    def clauses(self) -> list["ColumnElement[bool]"]:
+        """Return the WHERE clauses for the parameters that were given."""
+        lookups = Protein.__lookups__
+        return [
+            lookups[name](value) if name in lookups else getattr(Protein, name) == value
+            for name, value in self.model_dump(exclude_none=True).items()
+        ]
+
+
+def identifier_rows(protein: Protein) -> list[dict[str, Any]]:
+    """Return the `ProteinIdentifier` rows (as dicts) for the lists of `protein`."""
+    rows = {}
+    for kind, attr in IDENTIFIER_ATTRS.items():
+        for value in getattr(protein, attr) or []:
+            if value := normalize_identifier(kind, value):
+                rows[(kind, value)] = {
+                    "protein_id": protein.id,
+                    "kind": kind,
+                    "value": value,
+                }
+    return list(rows.values())
+
+
+def _delete_identifier_rows(session: Session, ids: Sequence[Any]) -> None:
+    stmt = delete(ProteinIdentifier).where(col(ProteinIdentifier.protein_id).in_(ids))
+    session.connection().execute(stmt)
+
+
+@listens_for(Session, "before_flush")
+def _delete_identifiers(session: Session, *_: Any) -> None:
+    # (before the proteins themselves are deleted, for the foreign key)
+    ids = [p.id for p in session.deleted if isinstance(p, Protein) and p.id]
+    if ids:
+        _delete_identifier_rows(session, ids)
+
+
+@listens_for(Session, "after_flush")
+def _sync_identifiers(session: Session, _: Any) -> None:
+    attrs = IDENTIFIER_ATTRS.values()
+    changed = [
+        p
+        for p in chain(session.new, session.dirty)
+        if isinstance(p, Protein)
+        and p not in session.deleted
+        and (
+            p in session.new
+            or any(instance_state(p).attrs[a].history.has_changes() for a in attrs)
+        )
+    ]
+    if not changed:
+        return
+    if stale := [p.id for p in changed if p not in session.new]:
+        _delete_identifier_rows(session, stale)
+    if rows := [row for p in changed for row in identifier_rows(p)]:
+        session.connection().execute(insert(ProteinIdentifier), rows)
+
+
+def _names(protein: Protein) -> list[str]:
+    return [protein.name, *(protein.aliases or [])]
+
+
+# which attributes each in-process index is derived from, how to get its value,
+# and the indexes to update when a protein with changes to those attributes is
+# committed (or deleted, which removes it from the indexes).
+_INDEX_FEEDS: list[tuple[tuple[str, ...], Callable[[Protein], Any], tuple]] = [
+    (("seq",), attrgetter("seq"), (SEQ_INDEX, SEQ_LSH)),
+    (("name", "aliases"), _names, (NAME_INDEX,)),
+]
+_INDEX_CHANGES = "protein_index_changes"
+
+
+def _index_changes(session: Session) -> list[dict[int, Any]]:
+    """Return the index changes (for each feed) to apply when `session` commits."""
+    changes: list[dict[int, Any]]
+    changes = session.info.setdefault(_INDEX_CHANGES, [{} for _ in _INDEX_FEEDS])
+    return changes
+
+
+@listens_for(Session, "after_flush")
+def _collect_index_changes(session: Session, _: Any) -> None:
+    # new/dirty/deleted and attribute history still reflect the flushed changes
+    changes = _index_changes(session)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Protein) or obj.id is None:
+            continue
+        state = instance_state(obj)
+        for (attrs, value, _), feed_changes in zip(_INDEX_FEEDS, changes, strict=True):
+            if obj in session.deleted:
+                feed_changes[obj.id] = None
+            elif obj in session.new or any(
+                state.attrs[attr].history.has_changes() for attr in attrs
+            ):
+                feed_changes[obj.id] = value(obj)
+
+
+def _bulk_changed(session: Session, rows: Sequence[Any], attrs: set[str]) -> None:
+    """Update identifiers and index changes for `rows` (updated in `attrs`)."""
+    if attrs.intersection(IDENTIFIER_ATTRS.values()):
+        _delete_identifier_rows(session, [row.id for row in rows])
+        if new := [r for row in rows for r in identifier_rows(row)]:
+            session.connection().execute(insert(ProteinIdentifier), new)
+    changes = _index_changes(session)
+    for (feed_attrs, value, _), feed_changes in zip(_INDEX_FEEDS, changes, strict=True):
+        if attrs.intersection(feed_attrs):
+            feed_changes.update((row.id, value(row)) for row in rows)
+
+
+def _bulk_deleted(session: Session, ids: Sequence[Any]) -> None:
+    # (the foreign key cascades, but not on sqlite without `PRAGMA foreign_keys`)
+    _delete_identifier_rows(session, ids)
+    for feed_changes in _index_changes(session):
+        feed_changes.update(dict.fromkeys(ids))
+
+
+@listens_for(Session, "after_commit")
+def _apply_index_changes(session: Session) -> None:
+    if changes := session.info.pop(_INDEX_CHANGES, None):
+        for (*_, indexes), feed_changes in zip(_INDEX_FEEDS, changes, strict=True):
+            if feed_changes:
+                for index in indexes:
+                    index.update(feed_changes.items())
+
+
+@listens_for(Session, "after_rollback")
+def _discard_index_changes(session: Session) -> None:
+    session.info.pop(_INDEX_CHANGES, None)
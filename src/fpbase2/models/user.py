@@ -32,17 +32,19 @@ class UserBase(FPBaseModel):
 
 class User(UserBase, table=True):
     id: int | None = Field(default=None, primary_key=True)
+    # these can be very long, so they are only loaded when accessed (or as asked
+    # for with `User.objects.select(load=selectinload(User.proteins_created))`)
     proteins_created: list["Protein"] = Relationship(
         back_populates="created_by",
         sa_relationship_kwargs={
             "primaryjoin": "Protein.created_by_id==User.id",
-            "lazy": "joined",
+            "lazy": "select",
         },
     )
     proteins_updated: list["Protein"] = Relationship(
         back_populates="updated_by",
         sa_relationship_kwargs={
             "primaryjoin": "Protein.updated_by_id==User.id",
-            "lazy": "joined",
+            "lazy": "select",
         },
     )
@@ -0,0 +1,100 @@
+from collections.abc import AsyncIterator, Callable, Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from fpbase2 import async_routes, main
+from fpbase2.core.config import settings
+from fpbase2.core.db import get_async_session
+from fpbase2.models.protein import ProteinRead
+
+from .utils.protein import ProteinFactory
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def async_client(tmp_path: Path) -> Iterator[TestClient]:
+    # NullPool: connections must not outlive the event loop that created them
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'db.sqlite'}", poolclass=NullPool
+    )
+
+    async def _get_session() -> AsyncIterator[AsyncSession]:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    app = FastAPI()
+    app.dependency_overrides[get_async_session] = _get_session
+    app.post(main.URL.PROTEINS, response_model=ProteinRead)(async_routes.create_protein)
+    app.get(main.URL.PROTEINS, response_model=list[ProteinRead])(
+        async_routes.read_proteins
+    )
+    app.get(main.URL.PROTEIN, response_model=ProteinRead)(async_routes.read_protein)
+    app.put(main.URL.PROTEIN, response_model=ProteinRead)(async_routes.update_protein)
+    app.patch(main.URL.PROTEIN, response_model=ProteinRead)(async_routes.patch_protein)
+    app.delete(main.URL.PROTEIN)(async_routes.delete_protein)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_async_crud(async_client: TestClient) -> None:
+    protein = ProteinFactory.build()
+    response = async_client.post("/proteins/", json=protein.model_dump(mode="json"))
+    assert response.status_code == 200
+    content = response.json()
+    assert content["slug"] == protein.slugified_name()
+    assert len(content["uuid"]) == 5
+    url = f"/proteins/{content['id']}"
+
+    response = async_client.get(url)
+    assert response.json()["name"] == protein.name
+    etag = response.headers["ETag"]
+    assert async_client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    response = async_client.get("/proteins/", params={"limit": 1})
+    assert [p["id"] for p in response.json()] == [content["id"]]
+    assert "X-Next-Cursor" in response.headers
+    assert async_client.get("/proteins/", params={"limit": -1}).status_code == 422
+
+    response = async_client.put(url, json={"name": "Updated name"})
+    assert response.json()["slug"] == "updated-name"
+    response = async_client.patch(url, json={"name": "Patched name", "pdb": ["1ema"]})
+    assert response.json()["slug"] == "patched-name"
+    assert (
+        async_client.get("/proteins/", params={"pdb": "1EMA"}).json()[0]["id"]
+        == (content["id"])
+    )
+
+    etag = async_client.get("/proteins/", params={"pdb": "1EMA"}).headers["ETag"]
+    assert async_client.delete(url).json() == {"ok": True}
+    assert async_client.get(url).status_code == 404
+    headers = {
+        "If-None-Match": etag,
+        "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT",
+    }
+    response = async_client.get("/proteins/", params={"pdb": "1EMA"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_async_alternative(monkeypatch: pytest.MonkeyPatch) -> None:
+    def sync_route() -> None:
+        """Docs."""
+
+    async def async_route() -> None: ...
+
+    assert main.async_alternative(async_route)(sync_route) is sync_route
+    monkeypatch.setattr(settings, "ASYNC_DB", True)
+    route: Callable[..., Any] = main.async_alternative(async_route)(sync_route)
+    assert route is async_route
+    assert async_route.__doc__ == "Docs."
@@ -0,0 +1,210 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Literal
+
+import pytest
+from fastapi import Request
+from sqlalchemy.exc import OperationalError, StatementError
+from sqlalchemy.pool import QueuePool
+from sqlmodel import create_engine
+from sqlmodel.pool import StaticPool
+
+from fpbase2.core import db
+from fpbase2.core.config import Settings, settings
+from fpbase2.core.utils import (
+    _NATIVE_READ_ONLY,
+    _set_read_only,
+    can_modify_database,
+    make_engine_read_only,
+)
+
+
+def test_engine_kwargs(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert db.engine_kwargs("sqlite://")["poolclass"] is StaticPool
+
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 20)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT", 5000)
+    kwargs = db.engine_kwargs("postgresql+psycopg://user@host/fpbase")
+    assert kwargs["pool_size"] == 20
+    assert kwargs["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+    assert kwargs["connect_args"] == {"options": "-c statement_timeout=5000"}
+
+
+@pytest.mark.parametrize("method", ["GET", "POST", "PUT", "DELETE"])
+def test_read_requests_use_replica(
+    method: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    replica = create_engine("sqlite://")
+    monkeypatch.setattr(db, "read_engine", replica)
+
+    request = Request({"type": "http", "method": method, "headers": []})
+    sessions = db.get_session(request)
+    session = next(sessions)
+    assert session.bind is (replica if method == "GET" else db.engine)
+    sessions.close()
+
+
+def test_file_sqlite_engine(tmp_path: Path) -> None:
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'fpbase.db'}")
+    try:
+        assert isinstance(engine.pool, QueuePool)
+        with engine.connect() as conn:
+            pragma = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+            assert pragma == "wal"
+            pragma = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            assert pragma == db.SQLITE_PRAGMAS["busy_timeout"]
+
+        # two connections can be checked out (and read) at once
+        with engine.connect() as c1, engine.connect() as c2:
+            assert c1.exec_driver_sql("SELECT 1").scalar() == 1
+            assert c2.exec_driver_sql("SELECT 1").scalar() == 1
+    finally:
+        engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "statement, modifies",
+    [
+        ("SELECT protein.id FROM protein WHERE protein.slug = ?", False),
+        ("SELECT * FROM protein WHERE name = 'create'", False),
+        ("UPDATE protein SET name=? WHERE protein.id = ?", True),
+        ("insert into protein (name) values (?)", True),
+        ("CREATE INDEX ix_name ON protein (name)", True),
+    ],
+)
+def test_can_modify_database(statement: str, modifies: bool) -> None:
+    assert can_modify_database(statement) is modifies
+    assert can_modify_database(statement) is modifies
+    assert can_modify_database.cache_info().hits >= 1
+
+
+@pytest.mark.parametrize("native", [True, False])
+def test_read_only_engine(tmp_path: Path, native: bool) -> None:
+    path = tmp_path / "fpbase.db"
+    with closing(sqlite3.connect(path)) as raw, raw:
+        raw.execute("CREATE TABLE protein (name TEXT)")
+
+    engine = create_engine(f"sqlite:///{path}")
+    make_engine_read_only(engine, native=native)
+    error = OperationalError if native else StatementError
+    try:
+        # the second checkout gets the pooled connection back, after a rollback
+        for _ in range(2):
+            with engine.connect() as conn:
+                count = conn.exec_driver_sql("SELECT count(*) FROM protein").scalar()
+                assert count == 0
+                with pytest.raises(error, match="read"):
+                    conn.exec_driver_sql("INSERT INTO protein VALUES ('EGFP')")
+                conn.rollback()
+    finally:
+        engine.dispose()
+
+
+class _FakeConnection:
+    """A DBAPI connection that, like psycopg, opens a transaction implicitly."""
+
+    def __init__(self) -> None:
+        self.autocommit = False
+        self.executed: list[tuple[str, bool]] = []
+
+    def cursor(self) -> "_FakeConnection":
+        return self
+
+    def execute(self, statement: str) -> None:
+        self.executed.append((statement, self.autocommit))
+
+    def close(self) -> None: ...
+
+
+def test_read_only_outside_transaction() -> None:
+    # a SET executed in the implicit transaction would be undone by the rollback
+    # when the connection goes back to the pool
+    conn = _FakeConnection()
+    statement = _NATIVE_READ_ONLY["postgresql"]
+    _set_read_only(conn, statement)
+    assert conn.executed == [(statement, True)]
+    assert conn.autocommit is False
+
+
+@pytest.mark.parametrize(
+    "uri, memory",
+    [
+        ("sqlite://", True),
+        ("sqlite:///:memory:", True),
+        ("sqlite+aiosqlite://", True),
+        ("sqlite:///file:db?mode=memory&uri=true", True),
+        ("sqlite:///fpbase.db", False),
+        ("sqlite:////abs/fpbase.db", False),
+    ],
+)
+def test_is_memory_sqlite(uri: str, memory: bool) -> None:
+    assert db.is_memory_sqlite(uri) is memory
+    expected_pool = StaticPool if memory else None
+    assert db.engine_kwargs(uri).get("poolclass") is expected_pool
+
+
+@pytest.mark.parametrize("mode", ["memory", "immutable"])
+def test_snapshot_engine(tmp_path: Path, mode: Literal["memory", "immutable"]) -> None:
+    path = str(tmp_path / "fpbase.db")
+    with closing(sqlite3.connect(path)) as raw, raw:
+        raw.execute("CREATE TABLE protein (name TEXT)")
+        raw.execute("INSERT INTO protein VALUES ('EGFP')")
+
+    engine = db.make_snapshot_engine(path, mode)
+    try:
+        with engine.connect() as conn:
+            query = "SELECT name FROM protein"
+            assert conn.exec_driver_sql(query).scalars().all() == ["EGFP"]
+            with pytest.raises(OperationalError, match="readonly"):
+                conn.exec_driver_sql("INSERT INTO protein VALUES ('mCherry')")
+    finally:
+        engine.dispose()
+
+    if mode == "memory":
+        # the snapshot no longer depends on the file
+        Path(path).unlink()
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql(query).scalar() == "EGFP"
+        engine.dispose()
+
+
+def test_snapshot_engine_threads(tmp_path: Path) -> None:
+    path = str(tmp_path / "fpbase.db")
+    with closing(sqlite3.connect(path)) as raw, raw:
+        raw.execute("CREATE TABLE protein (name TEXT)")
+        raw.executemany("INSERT INTO protein VALUES (?)", [("EGFP",)] * 100)
+
+    engine = db.make_snapshot_engine(path, "memory")
+    n_threads = 10
+    barrier = threading.Barrier(n_threads, timeout=10)
+
+    def _read(_: int) -> int:
+        with engine.connect() as conn:
+            barrier.wait()  # all connections are checked out at once
+            rows = conn.exec_driver_sql("SELECT name FROM protein").all()
+            barrier.wait()
+            return len(rows)
+
+    try:
+        assert isinstance(engine.pool, QueuePool)
+        with ThreadPoolExecutor(n_threads) as executor:
+            assert list(executor.map(_read, range(n_threads))) == [100] * n_threads
+    finally:
+        engine.dispose()
+
+
+def test_snapshot_requires_read_only() -> None:
+    with pytest.raises(ValueError, match="READ_ONLY"):
+        Settings(DB_SQLITE_PATH="fpbase.db", DB_SNAPSHOT="memory")
+    with pytest.raises(ValueError, match="file"):
+        Settings(DB_SQLITE_PATH=":memory:", DB_SNAPSHOT="memory", READ_ONLY=True)
+    assert Settings(DB_SQLITE_PATH="fpbase.db", DB_SNAPSHOT="memory", READ_ONLY=True)
+
+
+def test_async_db_requires_sqlite_file() -> None:
+    with pytest.raises(ValueError, match="file"):
+        Settings(DB_SQLITE_PATH=":memory:", ASYNC_DB=True)
+    assert Settings(DB_SQLITE_PATH="fpbase.db", ASYNC_DB=True).ASYNC_DB
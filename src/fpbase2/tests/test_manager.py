@@ -0,0 +1,367 @@
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import instance_state
+from sqlmodel import Session
+
+from fpbase2 import crud
+from fpbase2.core.db import engine
+from fpbase2.models import Protein, User, _manager
+from fpbase2.models._cache import IdentityCache
+from fpbase2.models._manager import Manager
+from fpbase2.models.protein import NAME_INDEX
+from fpbase2.models.reference import ReferenceAuthorLink
+
+from .utils.protein import ProteinFactory, create_random_protein
+from .utils.utils import n_random_letters
+
+
+@pytest.fixture
+def manager_session(db: Session) -> Iterator[Session]:
+    Manager.set_session(db)
+    yield db
+    Manager._session_ = None
+
+
+@pytest.fixture
+def cache(manager_session: Session) -> Iterator[IdentityCache]:
+    before = Manager._cache_
+    cache = IdentityCache(maxsize=100)
+    Manager.set_cache(cache)
+    yield cache
+    Manager.set_cache(before)
+
+
+@pytest.fixture
+def statements() -> Iterator[list[str]]:
+    executed: list[str] = []
+
+    def _log(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _log)
+    yield executed
+    event.remove(engine, "before_cursor_execute", _log)
+
+
+def test_manager_per_model() -> None:
+    # the `objects` descriptor is inherited from FPBaseModel
+    assert Protein.objects._model is Protein
+    assert User.objects._model is User
+    assert User.objects is User.objects
+
+
+def test_identity_cache_get(
+    manager_session: Session, cache: IdentityCache, statements: list[str]
+) -> None:
+    protein = create_random_protein(manager_session)
+    pid, name = protein.id, protein.name
+    manager_session.expunge_all()
+
+    assert Protein.objects.get(pid).name == name
+    assert Manager.cache_info().misses == 1  # type: ignore [union-attr]
+
+    # a new session (simulated by clearing the identity map) hits the cache
+    manager_session.expunge_all()
+    statements.clear()
+    assert Protein.objects.get(pid).name == name
+    assert Manager.cache_info().hits == 1  # type: ignore [union-attr]
+    assert not statements
+
+    # unique columns are also served from the cache
+    manager_session.expunge_all()
+    assert Protein.objects.where(slug=protein.slug, limit=1).id == pid
+    assert Manager.cache_info().hits == 2  # type: ignore [union-attr]
+    assert not statements
+
+
+def test_identity_cache_invalidation(
+    manager_session: Session, cache: IdentityCache
+) -> None:
+    protein = create_random_protein(manager_session)
+    pid, old_slug = protein.id, protein.slug
+    manager_session.expunge_all()
+
+    protein = Protein.objects.get(pid)  # now cached
+    protein.name = "Renamed Protein"
+    protein.save()
+    manager_session.expunge_all()
+
+    assert Protein.objects.get(pid).name == "Renamed Protein"
+    manager_session.expunge_all()
+    assert Protein.objects.where(slug=old_slug, limit=1) is None
+    assert Manager.cache_info().hits == 0  # type: ignore [union-attr]
+
+
+def test_identity_cache_per_model(
+    manager_session: Session, cache: IdentityCache
+) -> None:
+    name = n_random_letters(10)
+    user = User(username=name, password="-", email=f"{name}@example.com")  # noqa: S106
+    manager_session.add(user)
+    manager_session.commit()
+    uid = user.id
+    manager_session.expunge_all()
+
+    user = User.objects.get(uid)  # now cached
+    user.username = f"{name}-renamed"
+    user.save()
+    manager_session.expunge_all()
+    assert User.objects.get(uid).username == f"{name}-renamed"
+
+
+def test_identity_cache_composite_key(
+    manager_session: Session, cache: IdentityCache
+) -> None:
+    ident = (999_001, 999_002)  # (author_id, reference_id)
+    link = ReferenceAuthorLink(author_id=ident[0], reference_id=ident[1], author_idx=0)
+    manager_session.add(link)
+    manager_session.commit()
+    manager_session.expunge_all()
+
+    link = ReferenceAuthorLink.objects.get(ident)  # now cached
+    assert cache.get(ReferenceAuthorLink, ident) is not None
+    link.author_idx = 1
+    link.save()
+    assert cache.get(ReferenceAuthorLink, ident) is None
+    manager_session.expunge_all()
+    assert ReferenceAuthorLink.objects.get(ident).author_idx == 1
+
+    manager_session.delete(ReferenceAuthorLink.objects.get(ident))
+    manager_session.commit()
+    assert cache.get(ReferenceAuthorLink, ident) is None
+    manager_session.expunge_all()
+    assert ReferenceAuthorLink.objects.get(ident, raises=False) is None
+
+
+def test_identity_cache_invalidated_on_commit(
+    manager_session: Session, cache: IdentityCache
+) -> None:
+    protein = create_random_protein(manager_session)
+    pid = protein.id
+    manager_session.expunge_all()
+    old = Protein.objects.get(pid).model_dump()
+
+    protein = Protein.objects.get(pid)
+    protein.name = n_random_letters(12)
+    manager_session.flush()
+    assert cache.get(Protein, (pid,)) is None
+    # another session caches the committed (soon to be stale) row before commit
+    cache.set(Protein, (pid,), old)
+    manager_session.commit()
+    assert cache.get(Protein, (pid,)) is None
+
+
+def test_identity_cache_skips_uncommitted(
+    manager_session: Session, cache: IdentityCache
+) -> None:
+    first = create_random_protein(manager_session)
+    pid, name, uuid = first.id, first.name, first.uuid
+    second = create_random_protein(manager_session).id
+    manager_session.expunge_all()
+
+    protein = Protein.objects.get(pid)
+    cache.clear()
+    protein.name = n_random_letters(12)
+    # the lookup autoflushes the rename, so the row it reads must not be cached
+    assert Protein.objects.where(uuid=uuid, limit=1) is protein
+    assert Protein.objects.in_bulk([second])
+    manager_session.rollback()
+    assert cache.cache_info().currsize == 0
+
+    # once the transaction is over, rows are cached again
+    manager_session.expunge_all()
+    assert Protein.objects.get(pid).name == name
+    assert cache.cache_info().currsize > 0
+
+
+@pytest.mark.parametrize("attempts", [_manager.RANDOM_ATTEMPTS, 0])
+def test_random(
+    manager_session: Session, monkeypatch: pytest.MonkeyPatch, attempts: int
+) -> None:
+    monkeypatch.setattr(_manager, "RANDOM_ATTEMPTS", attempts)  # 0: only fallback
+    for _ in range(3):
+        create_random_protein(manager_session)
+    total = Protein.objects.count()
+
+    assert isinstance(Protein.objects.random(), Protein)
+    sample = Protein.objects.random(3)
+    assert len({p.id for p in sample}) == 3
+    everything = Protein.objects.random(total + 5)
+    assert len(everything) == total
+    assert {p.id for p in everything} == {p.id for p in Protein.objects.all()}
+
+
+def test_iter(manager_session: Session) -> None:
+    for _ in range(5):
+        create_random_protein(manager_session)
+    manager_session.expunge_all()
+    ids = [p.id for p in Protein.objects.all()]
+    manager_session.expunge_all()
+
+    seen = []
+    for protein in Protein.objects.iter(batch_size=2, order_by=Protein.id):
+        seen.append(protein.id)
+        if protein.id == ids[0]:
+            protein.name = "Modified while iterating"
+    assert seen == ids
+    # only the modified object is still held by the session
+    assert [key[1] for key in manager_session.identity_map.keys()] == [(ids[0],)]
+    manager_session.rollback()
+
+
+def test_in_bulk(
+    manager_session: Session, cache: IdentityCache, statements: list[str]
+) -> None:
+    proteins = [create_random_protein(manager_session) for _ in range(5)]
+    ids = [p.id for p in proteins]
+    manager_session.expunge_all()
+    Protein.objects.get(ids[0])  # cached
+
+    manager_session.expunge_all()
+    statements.clear()
+    found = Protein.objects.in_bulk([*reversed(ids), -1, ids[1]], chunk_size=2)
+    assert list(found) == ids[::-1]
+    assert all(found[i].id == i for i in ids)
+    # the cached key needs no query: 4 other ids and -1, in chunks of 2
+    assert len(statements) == 3
+
+    assert [p.id for p in Protein.objects.get_many(ids[:2])] == ids[:2]
+    with pytest.raises(KeyError, match=r"\[-1\]"):
+        Protein.objects.get_many([ids[0], -1])
+    assert len(Protein.objects.get_many([ids[0], -1], raises=False)) == 1
+
+
+def _new_protein() -> Protein:
+    return Protein.model_validate(ProteinFactory.build())
+
+
+def test_batch(manager_session: Session) -> None:
+    commits: list[Session] = []
+    on_commit = commits.append
+    event.listen(manager_session, "after_commit", on_commit)
+    try:
+        with Protein.objects.batch(flush_every=3, refresh=True):
+            saved = [_new_protein() for _ in range(4)]
+            for protein in saved[:2]:
+                protein.save()
+            created = Protein.objects.create(ProteinFactory.build())
+            # flushed after 3 calls, but not committed
+            assert all(p.id is not None for p in [*saved[:2], created])
+            assert not commits
+            saved[0].delete()
+            saved[3].save()
+            with Protein.objects.batch():  # nested blocks join the outer one
+                saved[2].save()
+        assert len(commits) == 1
+    finally:
+        event.remove(manager_session, "after_commit", on_commit)
+
+    assert "slug" in saved[1].__dict__  # refreshed (not left expired)
+    ids = [p.id for p in [*saved[1:], created]]
+    assert [p.id for p in Protein.objects.get_many(ids)] == ids
+    assert Protein.objects.get(saved[0].id, raises=False) is None
+
+
+def test_batch_rollback(manager_session: Session) -> None:
+    before = Protein.objects.count()
+    with pytest.raises(RuntimeError), Protein.objects.batch(flush_every=1):
+        _new_protein().save()
+        raise RuntimeError
+    assert Protein.objects.count() == before
+    assert Manager._batch_.get() is None
+
+
+def test_batch_per_thread(manager_session: Session) -> None:
+    with Protein.objects.batch() as batch, ThreadPoolExecutor(1) as pool:
+        # e.g. other requests, in FastAPI's threadpool
+        assert pool.submit(Manager._batch_.get).result() is None
+        assert Manager._batch_.get() is batch
+
+
+def test_bulk_update_delete(manager_session: Session) -> None:
+    chromophore = n_random_letters(5)
+    proteins = [
+        Protein.objects.create(ProteinFactory.build(chromophore=chromophore))
+        for _ in range(3)
+    ]
+    crud.autocomplete_proteins(session=manager_session, query="x", limit=1)
+    ids = [p.id for p in proteins]
+    modified = proteins[0].modified
+
+    where = Protein.chromophore == chromophore
+    assert Protein.objects.update(where, seq_validated=True) == 3
+    assert Protein.objects.update(Protein.id == -1, seq_validated=False) == 0
+    for protein in Protein.objects.get_many(ids):
+        assert protein.seq_validated
+    assert proteins[0].modified > modified
+
+    # derived columns and the alias table are kept in step
+    count = Protein.objects.update(
+        Protein.id == ids[0], name="Bulk Renamed", aliases=["BulkAlias"]
+    )
+    assert count == 1
+    protein = Protein.objects.get(ids[0])
+    assert (protein.name, protein.slug) == ("Bulk Renamed", "bulk-renamed")
+    assert [p.id for p in Protein.objects.where(alias="BulkAlias")] == ids[:1]
+    assert [s.key for s in NAME_INDEX.search("bulk renamed")] == ids[:1]
+    Protein.objects.update(Protein.id == ids[1], seq="* *")
+    assert Protein.objects.get(ids[1]).seq_digest is None
+
+    assert Protein.objects.delete(where) == 3
+    assert Protein.objects.get_many(ids, raises=False) == []
+    assert Protein.objects.where(alias="BulkAlias") == []
+    assert NAME_INDEX.search("bulk renamed") == []
+
+
+def test_bulk_update_without_returning(
+    manager_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(engine.dialect, "update_returning", False)
+    monkeypatch.setattr(engine.dialect, "delete_returning", False)
+    chromophore = n_random_letters(5)
+    for _ in range(2):
+        Protein.objects.create(ProteinFactory.build(chromophore=chromophore))
+
+    where = Protein.chromophore == chromophore
+    assert Protein.objects.update(where, seq_comment="bulk") == 2
+    assert Protein.objects.delete(where) == 2
+    assert Protein.objects.where(where) == []
+
+
+def test_select_loading(manager_session: Session, statements: list[str]) -> None:
+    name = n_random_letters(10)
+    user = User(username=name, password="-", email=f"{name}@example.com")  # noqa: S106
+    manager_session.add(user)
+    manager_session.commit()
+    uid = user.id
+    for _ in range(3):
+        data = {**ProteinFactory.build().model_dump(), "created_by_id": uid}
+        Protein.objects.create(data)
+
+    # proteins are not joined to every user query...
+    manager_session.expunge_all()
+    statements.clear()
+    found = User.objects.where(username=name, limit=1)
+    assert "JOIN" not in statements[-1]
+    assert "proteins_created" in instance_state(found).unloaded
+
+    # ...but can be loaded together when needed
+    manager_session.expunge_all()
+    load = (selectinload(User.proteins_created), selectinload(User.proteins_updated))  # type: ignore [arg-type]
+    found = User.objects.select(where=User.id == uid, load=load).one()
+    statements.clear()
+    assert len(found.proteins_created) == 3
+    assert not statements
+
+    manager_session.expunge_all()
+    protein = Protein.objects.select(defer=["seq", Protein.blurb], limit=1).one()
+    assert {"seq", "blurb"} <= instance_state(protein).unloaded
+    manager_session.expunge_all()
+    protein = Protein.objects.select(only=[Protein.name], limit=1).one()
+    assert "name" not in instance_state(protein).unloaded
+    assert "seq" in instance_state(protein).unloaded
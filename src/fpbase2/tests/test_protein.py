@@ -1,5 +1,26 @@
+import base64
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlalchemy import delete, event, text, update
+from sqlmodel import Session, col, select
+
+from fpbase2 import crud
+from fpbase2.core.db import engine
+from fpbase2.models import Protein
+from fpbase2.models._cache import IdentityCache
+from fpbase2.models._manager import Manager
+from fpbase2.models.protein import ProteinFilter, ProteinIdentifier, ProteinRead
+from fpbase2.utils.pagination import count_statement
+from fpbase2.utils.text import new_id, new_unique_ids, seq_digest
 
 from .utils.protein import ProteinFactory, create_random_protein
 from .utils.utils import n_random_aa, n_random_letters
@@ -82,3 +103,423 @@ def test_delete_protein(client: TestClient, db: Session) -> None:
     # assert db.get(Protein, protein.id) is None
     # with pytest.raises(HTTPException):
     #     assert read_or_404(db, Protein, protein.id)
+
+
+def test_read_proteins_cursor(client: TestClient, db: Session) -> None:
+    for _ in range(5):
+        create_random_protein(db)
+
+    for order_by in ("id", "modified"):
+        seen: list[int] = []
+        response = client.get("/proteins/", params={"limit": 2, "order_by": order_by})
+        while True:
+            assert response.status_code == 200
+            seen.extend(p["id"] for p in response.json())
+            if not (cursor := response.headers.get("X-Next-Cursor")):
+                break
+            response = client.get("/proteins/", params={"limit": 2, "cursor": cursor})
+
+        # every protein is visited exactly once
+        assert set(seen) == set(db.exec(select(Protein.id)).all())
+        assert len(seen) == len(set(seen))
+
+
+def test_read_proteins_filtered(client: TestClient, db: Session) -> None:
+    tag = n_random_letters(5)
+    ids = []
+    for switch_type, agg, validated in [
+        ("ps", "m", True),
+        ("ps", "d", False),
+        ("b", "m", False),
+    ]:
+        protein = ProteinFactory.build(
+            chromophore=tag, switch_type=switch_type, agg=agg, seq_validated=validated
+        )
+        response = client.post("/proteins/", json=protein.model_dump(mode="json"))
+        ids.append(response.json()["id"])
+
+    params: dict[str, Any] = {"chromophore": tag, "switch_type": "ps", "count": True}
+    response = client.get("/proteins/", params=params)
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == ids[:2]
+    assert response.headers["X-Total-Count"] == "2"
+
+    response = client.get("/proteins/", params={**params, "limit": 1})
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "2"
+    response = client.get("/proteins/", params={**params, "agg": "m"})
+    assert [p["id"] for p in response.json()] == ids[:1]
+    response = client.get("/proteins/", params={"chromophore": tag, "seq_validated": 0})
+    assert [p["id"] for p in response.json()] == ids[1:]
+    assert "X-Total-Count" not in response.headers
+    assert client.get("/proteins/", params={"agg": "nope"}).status_code == 422
+
+    # filtered counts are answered from an index
+    clauses = ProteinFilter(switch_type="ps", agg="m").clauses()
+    sql = count_statement(Protein, clauses).compile(
+        db.get_bind(), compile_kwargs={"literal_binds": True}
+    )
+    plan = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    assert "ix_protein_switch_type_agg" in str(plan)
+
+
+def _raw_cursor(payload: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not-a-cursor",
+        _raw_cursor(["id", ["x"]]),
+        _raw_cursor(["id", [None]]),
+        _raw_cursor(["id", 1]),
+        _raw_cursor(["modified", ["yesterday", 1]]),
+    ],
+)
+def test_read_proteins_invalid_cursor(client: TestClient, cursor: str) -> None:
+    response = client.get("/proteins/", params={"cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("limit", [0, -1, 101, 100000])
+def test_read_proteins_invalid_limit(client: TestClient, limit: int) -> None:
+    assert client.get("/proteins/", params={"limit": limit}).status_code == 422
+
+
+def test_create_proteins_bulk(client: TestClient, db: Session) -> None:
+    existing = create_random_protein(db)
+    proteins = [p.model_dump(mode="json") for p in ProteinFactory.batch(20)]
+    proteins.insert(3, {"seq": "ABCDE"})  # no name
+    proteins.insert(7, {"name": existing.name})  # existing slug
+    proteins.append({**proteins[0]})  # duplicate within batch
+    # (sqlite doesn't enforce foreign keys, so this is only caught by the check)
+    proteins[10]["primary_reference_id"] = -1
+
+    response = client.post("/proteins/bulk", json=proteins)
+    assert response.status_code == 200
+    content = response.json()
+
+    assert [e["index"] for e in content["errors"]] == [3, 7, 10, 22]
+    assert content["errors"][0]["detail"][0]["loc"] == ["name"]
+    assert content["errors"][2]["detail"].startswith("primary_reference_id -1")
+    assert len(content["created"]) == 19
+    for created in content["created"]:
+        assert created["id"] is not None
+        assert len(created["uuid"]) == 5
+    assert content["created"][0]["name"] == proteins[0]["name"]
+
+    too_many: list[dict[str, Any]] = [{}] * (crud.MAX_BULK_PROTEINS + 1)
+    assert client.post("/proteins/bulk", json=too_many).status_code == 422
+
+
+def test_uuid_allocation_is_batched(db: Session) -> None:
+    statements: list[str] = []
+
+    def _log(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _log)
+    try:
+        db.add_all([Protein.model_validate(p) for p in ProteinFactory.batch(10)])
+        db.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", _log)
+
+    uuid_queries = [s for s in statements if s.startswith("SELECT protein.uuid")]
+    assert len(uuid_queries) == 1
+
+
+def test_create_proteins_is_batched(db: Session) -> None:
+    statements: list[str] = []
+
+    def _log(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _log)
+    try:
+        proteins = ProteinFactory.batch(50)
+        result = crud.create_proteins(session=db, proteins_in=proteins, batch_size=20)
+    finally:
+        event.remove(engine, "before_cursor_execute", _log)
+
+    assert len(result.created) == 50
+    inserts = [s for s in statements if s.startswith("INSERT INTO protein ")]
+    assert len(inserts) == 3  # one per batch, not one per row
+
+
+def test_new_unique_ids() -> None:
+    existing = {new_id() for _ in range(100)}
+    ids = new_unique_ids(50, existing=existing)
+    assert len(set(ids)) == 50
+    assert not existing.intersection(ids)
+
+
+def test_export_proteins(client: TestClient, db: Session) -> None:
+    create_random_protein(db)
+    n_proteins = len(db.exec(select(Protein.id)).all())
+
+    response = client.get("/proteins/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert len(lines) == n_proteins
+    assert ProteinRead.model_validate_json(lines[0])
+
+    response = client.get("/proteins/export", headers={"Accept": "text/csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == n_proteins
+    assert rows[0]["uuid"]
+
+    response = client.get("/proteins/export", params={"format": "fasta"})
+    assert response.headers["content-type"].startswith("text/x-fasta")
+    assert response.text.startswith(">")
+    assert response.text.count(">") == len(
+        db.exec(select(Protein.id).where(Protein.seq.is_not(None))).all()  # type: ignore
+    )
+
+
+def test_read_protein_conditional(client: TestClient, db: Session) -> None:
+    protein = create_random_protein(db)
+    response = client.get(f"/proteins/{protein.id}")
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+
+    response = client.get(f"/proteins/{protein.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not response.content
+
+    headers = {"If-Modified-Since": last_modified}
+    response = client.get(f"/proteins/{protein.id}", headers=headers)
+    assert response.status_code == 304
+
+    client.put(f"/proteins/{protein.id}", json={"name": n_random_letters(8)})
+    response = client.get(f"/proteins/{protein.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = client.get("/proteins/0", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+
+def test_read_proteins_conditional(client: TestClient, db: Session) -> None:
+    for _ in range(4):
+        create_random_protein(db)
+    response = client.get("/proteins/", params={"limit": 3})
+    etag = response.headers["ETag"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    headers = {"If-None-Match": etag}
+    response = client.get("/proteins/", params={"limit": 3}, headers=headers)
+    assert response.status_code == 304
+    assert response.headers["X-Next-Cursor"] == cursor
+
+    response = client.get("/proteins/", params={"limit": 4}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_read_proteins_conditional_membership(client: TestClient, db: Session) -> None:
+    chromophore = n_random_letters(5)
+    params = {"chromophore": chromophore}
+    proteins = [
+        crud.create_protein(
+            session=db, protein_in=ProteinFactory.build(chromophore=chromophore)
+        )
+        for _ in range(2)
+    ]
+    response = client.get("/proteins/", params=params)
+    etag = response.headers["ETag"]
+    # the newest `modified` of a page doesn't reflect deleted rows
+    assert "Last-Modified" not in response.headers
+    future = "Fri, 01 Jan 2100 00:00:00 GMT"
+    headers = {"If-Modified-Since": future}
+    assert client.get("/proteins/", params=params, headers=headers).status_code == 200
+
+    client.delete(f"/proteins/{proteins[0].id}")
+    headers = {"If-None-Match": etag, "If-Modified-Since": future}
+    response = client.get("/proteins/", params=params, headers=headers)
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [proteins[1].id]
+
+
+def test_read_proteins_by_seq(client: TestClient, db: Session) -> None:
+    protein = ProteinFactory.build(seq=n_random_aa(100))
+    response = client.post("/proteins/", json=protein.model_dump(mode="json"))
+    first = response.json()
+    assert "X-Duplicate-Of" not in response.headers
+
+    duplicate = ProteinFactory.build(seq=protein.seq.lower() + "*")  # type: ignore
+    response = client.post("/proteins/", json=duplicate.model_dump(mode="json"))
+    assert response.headers["X-Duplicate-Of"] == str(first["id"])
+
+    query = " ".join([protein.seq[:50], protein.seq[50:]])  # type: ignore
+    response = client.get("/proteins/by-seq", params={"seq": query})
+    assert response.status_code == 200
+    found = response.json()
+    assert len(found) == 2
+    assert found[0]["id"] == first["id"]
+    assert client.get("/proteins/by-seq", params={"seq": "WWW"}).json() == []
+
+    # sequences without residues match nothing, not each other
+    for _ in range(2):
+        stops = ProteinFactory.build(seq="* *")
+        response = client.post("/proteins/", json=stops.model_dump(mode="json"))
+        assert "X-Duplicate-Of" not in response.headers
+        client.delete(f"/proteins/{response.json()['id']}")
+    assert client.get("/proteins/by-seq", params={"seq": "*"}).json() == []
+
+
+def test_backfill_seq_digests(db: Session) -> None:
+    protein = create_random_protein(db)
+    empty = create_random_protein(db)
+    db.execute(update(Protein).where(col(Protein.id) == empty.id).values(seq=""))
+    stops = create_random_protein(db)
+    db.execute(update(Protein).where(col(Protein.id) == stops.id).values(seq="**"))
+    db.execute(update(Protein).values(seq_digest=None))
+    db.commit()
+    db.refresh(protein)
+    modified = protein.modified
+
+    assert crud.backfill_seq_digests(session=db, batch_size=2) >= 1
+    db.refresh(protein)
+    db.refresh(empty)
+    db.refresh(stops)
+    assert protein.seq_digest == seq_digest(protein.seq)
+    assert protein.modified == modified
+    # (as when saved without residues)
+    assert empty.seq_digest is None
+    assert stops.seq_digest is None
+    assert crud.backfill_seq_digests(session=db) == 0
+
+
+def test_patch_protein(
+    client: TestClient, db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    protein = create_random_protein(db)
+    url = f"/proteins/{protein.id}"
+    response = client.get(url)
+    before, etag = response.json(), response.headers["ETag"]
+    cache = IdentityCache()
+    monkeypatch.setattr(Manager, "_cache_", cache)
+    monkeypatch.setattr(Manager, "_session_", db)
+    Protein.objects.get(protein.id)  # cached
+
+    statements: list[str] = []
+
+    def log(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", log)
+    try:
+        response = client.patch(url, json={"name": "Patched FP", "seq_validated": True})
+    finally:
+        event.remove(engine, "before_cursor_execute", log)
+    assert response.status_code == 200
+    assert len(statements) == 1, statements
+    assert statements[0].startswith("UPDATE")
+
+    patched = response.json()
+    assert patched["slug"] == "patched-fp"
+    assert patched["seq_validated"] is True
+    assert patched["seq"] == before["seq"]  # not in the body: unchanged
+    assert client.get(url).json() == patched
+    assert client.get(url).headers["ETag"] != etag  # `modified` was updated
+    assert cache.cache_info().currsize == 0
+
+    assert client.patch(url, json={}).json() == patched
+    assert client.patch(url, json={"name": None}).status_code == 422
+    assert client.patch("/proteins/-1", json={"name": "x"}).status_code == 404
+
+
+def test_patch_protein_conflict(client: TestClient, db: Session) -> None:
+    protein, other = create_random_protein(db), create_random_protein(db)
+    genbank = n_random_letters(10)
+    assert client.patch(f"/proteins/{other.id}", json={"genbank": genbank}).is_success
+    url = f"/proteins/{protein.id}"
+    before = client.get(url).json()
+
+    response = client.patch(url, json={"name": other.name.upper()})
+    assert response.status_code == 409
+    assert (
+        response.json()["detail"] == f"Protein with slug {other.slug!r} already exists"
+    )
+    response = client.patch(url, json={"genbank": genbank})
+    assert response.status_code == 409
+    assert response.json()["detail"].startswith("Protein with genbank")
+    assert client.get(url).json() == before
+
+
+def test_filter_proteins_by_identifier(client: TestClient, db: Session) -> None:
+    tag = n_random_letters(12)
+    protein = ProteinFactory.build(aliases=[f"{tag}-1", f"{tag}-2"], pdb=["1abc"])
+    created = client.post("/proteins/", json=protein.model_dump(mode="json")).json()
+    assert created["aliases"] == [f"{tag}-1", f"{tag}-2"]  # still a list
+
+    response = client.get("/proteins/", params={"alias": f"{tag}-2"})
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [created["id"]]
+    response = client.get("/proteins/", params={"pdb": "1ABC", "alias": f"{tag}-1"})
+    assert [p["id"] for p in response.json()] == [created["id"]]
+    assert client.get("/proteins/", params={"alias": f"{tag}-3"}).json() == []
+
+    Manager.set_session(db)
+    try:
+        assert [p.id for p in Protein.objects.where(alias=f"{tag}-1")] == [
+            created["id"]
+        ]
+        # rows follow changes to the lists, and are removed with the protein
+        update = {**protein.model_dump(mode="json"), "aliases": [f"{tag}-3"]}
+        client.put(f"/proteins/{created['id']}", json=update)
+        assert Protein.objects.where(alias=f"{tag}-1") == []
+        assert len(Protein.objects.where(alias=f"{tag}-3", pdb="1abc")) == 1
+
+        client.delete(f"/proteins/{created['id']}")
+        stmt = select(ProteinIdentifier).where(
+            ProteinIdentifier.protein_id == created["id"]
+        )
+        assert db.exec(stmt).all() == []
+    finally:
+        Manager._session_ = None
+
+
+# tables of the "fpbase" database have per-app prefixes (see FPBaseModel)
+PREFIXED_TABLES = """
+import json
+from sqlalchemy import inspect
+from fpbase2.core.db import engine
+from fpbase2.models.protein import ProteinIdentifier
+
+ProteinIdentifier.__table__.create(engine)
+table = ProteinIdentifier.__tablename__
+print(json.dumps([table, inspect(engine).get_foreign_keys(table)]))
+"""
+
+
+def test_identifier_table_prefix(tmp_path: Path) -> None:
+    env = {**os.environ, "DB_SQLITE_PATH": str(tmp_path / "fpbase")}
+    args = [sys.executable, "-c", PREFIXED_TABLES]
+    result = subprocess.run(args, env=env, capture_output=True, check=True)  # noqa: S603
+    table, (fk,) = json.loads(result.stdout)
+    assert table == "proteins_proteinidentifier"
+    assert fk["referred_table"] == "proteins_protein"
+    assert fk["constrained_columns"] == ["protein_id"]
+    assert fk["options"] == {"ondelete": "CASCADE"}
+
+
+def test_backfill_identifiers(db: Session) -> None:
+    protein = create_random_protein(db)
+    protein.aliases, protein.pdb = ["BackfillFP"], ["2xyz"]
+    db.add(protein)
+    db.commit()
+    db.execute(delete(ProteinIdentifier))
+    db.commit()
+
+    assert crud.backfill_identifiers(session=db, batch_size=2) >= 2
+    stmt = select(ProteinIdentifier.kind, ProteinIdentifier.value).where(
+        ProteinIdentifier.protein_id == protein.id
+    )
+    assert sorted(db.exec(stmt).all()) == [("alias", "BackfillFP"), ("pdb", "2XYZ")]
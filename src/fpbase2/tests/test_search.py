@@ -0,0 +1,244 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session
+
+from fpbase2.models import Protein
+from fpbase2.models._manager import Manager
+from fpbase2.models.protein import SEQ_INDEX, SEQ_LSH
+from fpbase2.utils.autocomplete import AutocompleteIndex
+from fpbase2.utils.fulltext import search_statement
+from fpbase2.utils.minhash import MinHashLSH
+from fpbase2.utils.seqindex import KmerIndex
+from fpbase2.utils.similarity import SimilarityIndex
+
+from .utils.protein import ProteinFactory, create_random_protein
+from .utils.utils import n_random_aa
+
+# letters that are not amino acids, so they never occur in random sequences
+MOTIF = "BJOUZ"
+
+
+def test_kmer_index() -> None:
+    index = KmerIndex(k=3)
+    index.update([(1, "MVSKGEELFTG"), (2, "mvskgeednma"), (3, None)])
+    assert len(index) == 2
+    assert index.search("SKGEE") == [1, 2]
+    assert index.search("skgeel") == [1]
+    assert index.search("GEEXN") == [2]
+    assert index.search("EEXXT") == [1]
+    assert index.search("MV") == [1, 2]  # shorter than k
+    assert index.search("SKGEE", limit=1) == [1]
+    assert index.search("WWW") == []
+
+    index.update([(1, None), (2, "WWWW")])
+    assert index.search("SKGEE") == []
+    assert index.search("WWW") == [2]
+
+
+def test_search_proteins_by_seq(client: TestClient, db: Session) -> None:
+    create_random_protein(db)
+    # first search builds the index from the database
+    response = client.get("/proteins/search/seq", params={"q": MOTIF})
+    assert response.status_code == 200
+    assert response.json() == []
+    assert SEQ_INDEX.built
+
+    # the index is kept current with changes made after it was built
+    protein = ProteinFactory.build(seq=n_random_aa(20) + MOTIF + n_random_aa(20))
+    created = client.post("/proteins/", json=protein.model_dump(mode="json")).json()
+    response = client.get("/proteins/search/seq", params={"q": MOTIF.lower()})
+    assert [p["id"] for p in response.json()] == [created["id"]]
+    response = client.get("/proteins/search/seq", params={"q": "JXUZ"})
+    assert [p["id"] for p in response.json()] == [created["id"]]
+
+    update = {**protein.model_dump(mode="json"), "seq": n_random_aa(40)}
+    client.put(f"/proteins/{created['id']}", json=update)
+    assert client.get("/proteins/search/seq", params={"q": MOTIF}).json() == []
+
+    update["seq"] = MOTIF
+    client.put(f"/proteins/{created['id']}", json=update)
+    assert len(client.get("/proteins/search/seq", params={"q": MOTIF}).json()) == 1
+    client.delete(f"/proteins/{created['id']}")
+    assert client.get("/proteins/search/seq", params={"q": MOTIF}).json() == []
+
+
+def test_search_proteins_by_seq_invalid(client: TestClient) -> None:
+    assert client.get("/proteins/search/seq", params={"q": "AC-GT"}).status_code == 422
+    assert client.get("/proteins/search/seq").status_code == 422
+    for limit in (0, 100000):
+        params: dict[str, str | int] = {"q": MOTIF, "limit": limit}
+        assert client.get("/proteins/search/seq", params=params).status_code == 422
+
+
+def test_similarity_index() -> None:
+    index = KmerIndex()
+    index.update([(1, "MVSKGEELFTG"), (2, "MVSKGEEDNMA"), (3, "VSKGEELFTG")])
+    similarity = SimilarityIndex(index)
+
+    (hits,) = similarity.search(["MVSKGEELFTG"], top=3)
+    assert hits[0] == (1, 100.0)
+    assert hits[1].key == 2
+    assert hits[1].identity == pytest.approx(100 * 7 / 11)
+    # without a band, the missing methionine shifts every residue
+    assert hits[2].key == 3
+    assert hits[2].identity < 20
+
+    hits_a, hits_b = similarity.search(["VSKGEELFTG", "WWW"], top=2, band=1)
+    assert hits_a == [(3, 100.0), (1, pytest.approx(100 * 10 / 11))]
+    assert hits_b[0].identity == 0
+
+    # the matrix is refreshed when the index changes
+    index.update([(3, None), (4, "MVSKGEELFTGW")])
+    (hits,) = similarity.search(["MVSKGEELFTGW"], top=1)
+    assert hits == [(4, 100.0)]
+
+
+def test_similar_proteins(client: TestClient) -> None:
+    protein = ProteinFactory.build(seq=MOTIF * 10)
+    created = client.post("/proteins/", json=protein.model_dump(mode="json")).json()
+    # 5 of 50 residues differ
+    protein = ProteinFactory.build(seq=_mutate(MOTIF * 10, 5))
+    similar = client.post("/proteins/", json=protein.model_dump(mode="json")).json()
+
+    query = {"seqs": [MOTIF * 10, "M" + MOTIF * 10], "top": 2, "band": 1}
+    response = client.post("/proteins/similar", json=query)
+    assert response.status_code == 200
+    exact, shifted = response.json()
+    assert exact["query"] == MOTIF * 10
+    assert exact["hits"][0]["protein"]["id"] == created["id"]
+    assert exact["hits"][0]["identity"] == 100
+    assert len(exact["hits"]) == 2
+    assert exact["hits"][1]["protein"]["id"] == similar["id"]
+    assert exact["hits"][1]["identity"] == 90
+    assert shifted["hits"][0]["protein"]["id"] == created["id"]
+    assert shifted["hits"][0]["identity"] == pytest.approx(100 * 50 / 51, abs=0.01)
+
+    client.delete(f"/proteins/{created['id']}")
+    client.delete(f"/proteins/{similar['id']}")
+    assert client.post("/proteins/similar", json={"seqs": ["A-C"]}).status_code == 422
+
+
+def _mutate(seq: str, n: int) -> str:
+    residues = list(seq)
+    for i in random.sample(range(len(seq)), n):
+        residues[i] = "W" if residues[i] != "W" else "Y"
+    return "".join(residues)
+
+
+def test_minhash_clusters() -> None:
+    base, other = n_random_aa(240), n_random_aa(240)
+    index = MinHashLSH()
+    index.update([(1, base), (2, _mutate(base, 1)), (3, other), (4, n_random_aa(240))])
+    assert index.similarity(1, 2) > 0.8
+    assert index.similarity(1, 3) < 0.2
+    assert index.clusters(0.8) == [[1, 2]]
+
+    # maintained incrementally
+    index.update([(5, _mutate(other, 1)), (2, None)])
+    assert index.clusters(0.8) == [[3, 5]]
+
+
+def test_near_duplicates(client: TestClient, db: Session) -> None:
+    Manager.set_session(db)
+    try:
+        Protein.objects.near_duplicates()  # build the index
+        seq = n_random_aa(240)
+        ids = []
+        for s in (seq, _mutate(seq, 1)):
+            protein = ProteinFactory.build(seq=s)
+            response = client.post("/proteins/", json=protein.model_dump(mode="json"))
+            ids.append(response.json()["id"])
+
+        clusters = Protein.objects.near_duplicates(threshold=0.8)
+        assert ids in [[p.id for p in cluster] for cluster in clusters]
+        assert SEQ_LSH.built
+    finally:
+        Manager._session_ = None
+
+
+def test_search_proteins(client: TestClient) -> None:
+    ids = {}
+    for name, aliases, blurb in [
+        ("Zorblatt Green", None, "a bright monomer"),
+        ("Other FP", ["zorblattish"], None),
+        ("Third FP", None, "derived from zorblatt green"),
+    ]:
+        protein = ProteinFactory.build(name=name, aliases=aliases, blurb=blurb)
+        response = client.post("/proteins/", json=protein.model_dump(mode="json"))
+        ids[name] = response.json()["id"]
+
+    response = client.get("/proteins/search", params={"q": "zorblat"})
+    assert response.status_code == 200
+    # name matches rank above alias matches, which rank above blurb matches
+    assert [p["id"] for p in response.json()] == list(ids.values())
+
+    response = client.get("/proteins/search", params={"q": "zorblatt green"})
+    assert [p["id"] for p in response.json()] == [
+        ids["Zorblatt Green"],
+        ids["Third FP"],
+    ]
+    response = client.get("/proteins/search", params={"q": "zorblat", "offset": 1})
+    assert len(response.json()) == 2
+
+    # the index follows updates and deletes
+    update = ProteinFactory.build(name="Renamed FP", blurb=None)
+    client.put(
+        f"/proteins/{ids['Zorblatt Green']}", json=update.model_dump(mode="json")
+    )
+    client.delete(f"/proteins/{ids['Other FP']}")
+    response = client.get("/proteins/search", params={"q": "zorblatt"})
+    assert [p["id"] for p in response.json()] == [ids["Third FP"]]
+    assert client.get("/proteins/search", params={"q": '"*'}).json() == []
+    for limit in (0, 100000):
+        params: dict[str, str | int] = {"q": "zorblatt", "limit": limit}
+        assert client.get("/proteins/search", params=params).status_code == 422
+
+
+def test_search_statement_postgres() -> None:
+    statement = search_statement(Protein, "green fp", "postgresql")
+    assert statement is not None
+    sql = str(statement.compile(dialect=postgresql.dialect()))  # type: ignore [no-untyped-call]
+    assert "search_vector @@ to_tsquery" in sql
+    assert "ts_rank" in sql
+
+
+def test_autocomplete_index() -> None:
+    index = AutocompleteIndex()
+    index.build([(1, ["mEGFP", "monomeric EGFP"]), (2, ["mCherry"]), (3, None)])
+    assert [s.key for s in index.search("m")] == [2, 1]
+    assert index.search("monomeric e") == [(1, "mEGFP", "monomeric EGFP")]
+    assert index.search("mchery") == [(2, "mCherry", "mCherry")]  # deletion
+    assert index.search("mcxerry") == [(2, "mCherry", "mCherry")]  # insertion
+    assert index.search("mc") == [(2, "mCherry", "mCherry")]
+    assert index.search("mx") == []  # too short to correct
+    assert index.search("m", limit=1) == [(2, "mCherry", "mCherry")]
+
+    index.update([(2, ["mCherry2"]), (1, None)])
+    assert index.search("mcherry") == [(2, "mCherry2", "mCherry2")]
+    assert index.search("megfp") == []
+
+
+def test_autocomplete_proteins(client: TestClient) -> None:
+    protein = ProteinFactory.build(name="Quixotic Red", aliases=["QRed-1"])
+    created = client.post("/proteins/", json=protein.model_dump(mode="json")).json()
+
+    response = client.get("/proteins/autocomplete", params={"q": "quixotic"})
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": created["id"], "name": "Quixotic Red", "match": "Quixotic Red"}
+    ]
+    response = client.get("/proteins/autocomplete", params={"q": "qred 1"})
+    assert response.json()[0]["match"] == "QRed-1"
+    response = client.get("/proteins/autocomplete", params={"q": "quixtoic"})
+    assert response.json()[0]["id"] == created["id"]
+
+    update = {**protein.model_dump(mode="json"), "name": "Placid Red"}
+    client.put(f"/proteins/{created['id']}", json=update)
+    assert client.get("/proteins/autocomplete", params={"q": "quixotic"}).json() == []
+    response = client.get("/proteins/autocomplete", params={"q": "placid"})
+    assert response.json()[0]["name"] == "Placid Red"
+    client.delete(f"/proteins/{created['id']}")
+    assert client.get("/proteins/autocomplete", params={"q": "placid"}).json() == []
@@ -15,6 +15,7 @@ class ProteinFactory(ModelFactory[ProteinCreate]):
 
     seq = partial(n_random_aa, 200)
     chromophore = partial(n_random_aa, 3)
+    primary_reference_id = None  # (a random id would refer to no reference)
 
     @classmethod
     def name(cls) -> str:
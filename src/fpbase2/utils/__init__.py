@@ -1,11 +1,30 @@
 from .crossref import crossref_work
-from .session import create_object, delete_object, read_or_404, update_object
+from .session import (
+    acreate_object,
+    adelete_object,
+    apatch_object,
+    aread_or_404,
+    aupdate_object,
+    create_object,
+    create_objects,
+    delete_object,
+    patch_object,
+    read_or_404,
+    update_object,
+)
 from .text import slugify
 
 __all__ = [
+    "acreate_object",
+    "adelete_object",
+    "apatch_object",
+    "aread_or_404",
+    "aupdate_object",
     "crossref_work",
     "create_object",
+    "create_objects",
     "delete_object",
+    "patch_object",
     "read_or_404",
     "slugify",
     "update_object",
@@ -0,0 +1,133 @@
+"""In-memory, typo-tolerant prefix index for autocompletion.
+
+Every name (and alias) of an item is normalized with `slugify` and stored in a
+sorted array of `(slug, key, text)` entries. All entries starting with a prefix
+are contiguous in the array, so they are found with a binary search. If there
+are too few of them, the search is repeated for every string within edit
+distance 1 of the prefix (deletions, transpositions, substitutions, insertions):
+
+    >>> index = AutocompleteIndex()
+    >>> index.update([(1, ["mEGFP", "monomeric EGFP"]), (2, ["mCherry"])])
+    >>> [s.key for s in index.search("mCh")]
+    [2]
+    >>> [s.match for s in index.search("mgef")]  # transposed letters
+    ['mEGFP']
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, insort
+from typing import TYPE_CHECKING, NamedTuple
+
+from .text import slugify
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# prefixes shorter than this are not corrected for typos
+MIN_FUZZY_LENGTH = 3
+
+
+class Suggestion(NamedTuple):
+    key: int
+    name: str  # the first (primary) name of the item
+    match: str  # the name or alias that matched
+
+
+class AutocompleteIndex:
+    """A thread-safe sorted-array index from slugified names to item keys."""
+
+    def __init__(self) -> None:
+        self.built = False
+        self._entries: list[tuple[str, int, str]] = []
+        self._names: dict[int, list[str]] = {}
+        self._alphabet: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def _entries_for(key: int, names: Iterable[str]) -> Iterator[tuple[str, int, str]]:
+        for text in dict.fromkeys(names):
+            if slug := slugify(text):
+                yield (slug, key, text)
+
+    def _add(self, key: int, names: list[str]) -> None:
+        self._discard(key)
+        self._names[key] = names
+        for entry in self._entries_for(key, names):
+            insort(self._entries, entry)
+            self._alphabet.update(entry[0])
+
+    def _discard(self, key: int) -> None:
+        if (names := self._names.pop(key, None)) is None:
+            return
+        for entry in self._entries_for(key, names):
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def update(self, items: Iterable[tuple[int, list[str] | None]]) -> None:
+        """Index (or re-index) the names of items by key. `None` removes the key."""
+        with self._lock:
+            for key, names in items:
+                if names:
+                    self._add(key, names)
+                else:
+                    self._discard(key)
+
+    def build(self, items: Iterable[tuple[int, list[str] | None]]) -> None:
+        """Replace the contents of the index with `items`, and mark it as built."""
+        with self._lock:
+            self._names = {key: names for key, names in items if names}
+            self._entries = sorted(
+                entry
+                for key, names in self._names.items()
+                for entry in self._entries_for(key, names)
+            )
+            self._alphabet = {char for entry in self._entries for char in entry[0]}
+            self.built = True
+
+    def _prefixed(self, prefix: str) -> Iterator[tuple[str, int, str]]:
+        i = bisect_left(self._entries, (prefix,))
+        while i < len(self._entries) and self._entries[i][0].startswith(prefix):
+            yield self._entries[i]
+            i += 1
+
+    def _edits(self, word: str) -> list[str]:
+        """Return all strings within edit distance 1 of `word` (sorted)."""
+        splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+        letters = self._alphabet
+        edits = {a + b[1:] for a, b in splits if b}
+        edits |= {a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1}
+        edits |= {a + c + b[1:] for a, b in splits if b for c in letters}
+        edits |= {a + c + b for a, b in splits for c in letters}
+        edits.discard(word)
+        return sorted(edits)
+
+    def _candidates(self, prefix: str) -> Iterator[str]:
+        yield prefix
+        # (edits are only generated if the exact prefix yields too few matches)
+        if len(prefix) >= MIN_FUZZY_LENGTH:
+            yield from self._edits(prefix)
+
+    def search(self, query: str, limit: int = 10) -> list[Suggestion]:
+        """Return up to `limit` items with a name starting with `query`.
+
+        Exact prefix matches come first, followed (if there are fewer than
+        `limit` of them) by matches of prefixes within edit distance 1.
+        """
+        if not (prefix := slugify(query)) or limit < 1:
+            return []
+
+        found: dict[int, Suggestion] = {}
+        with self._lock:
+            for candidate in self._candidates(prefix):
+                for _, key, text in self._prefixed(candidate):
+                    if key not in found:
+                        found[key] = Suggestion(key, self._names[key][0], text)
+                        if len(found) >= limit:
+                            return list(found.values())
+        return list(found.values())
@@ -0,0 +1,79 @@
+"""HTTP conditional request helpers (ETag / Last-Modified).
+
+Validators are derived from the `id` and `modified` columns of the rows in a
+response, so they can be computed from a cheap `SELECT id, modified` query,
+and a `304 Not Modified` can be returned without loading or serializing models.
+"""
+
+import datetime
+import hashlib
+from collections.abc import Iterable
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Protocol
+
+from fastapi import Request
+
+
+class Stamped(Protocol):
+    @property
+    def id(self) -> Any: ...
+    @property
+    def modified(self) -> datetime.datetime: ...
+
+
+def _utc(dt: datetime.datetime) -> datetime.datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=datetime.UTC)
+    return dt.astimezone(datetime.UTC)
+
+
+def validators(rows: Iterable[Stamped], last_modified: bool = True) -> dict[str, str]:
+    """Return `ETag` and `Last-Modified` headers for a response made of `rows`.
+
+    Collections should pass `last_modified=False`: their newest `modified` does
+    not change when rows are deleted or stop matching a filter, but their ETag
+    (which covers the ids) does.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    newest: datetime.datetime | None = None
+    for row in rows:
+        modified = _utc(row.modified)
+        digest.update(f"{row.id}@{modified.isoformat()};".encode())
+        if newest is None or modified > newest:
+            newest = modified
+
+    headers = {"ETag": f'W/"{digest.hexdigest()}"'}
+    if last_modified and newest is not None:
+        headers["Last-Modified"] = format_datetime(newest, usegmt=True)
+    return headers
+
+
+def is_conditional(request: Request, last_modified: bool = True) -> bool:
+    """Return True if `request` carries `If-None-Match` or `If-Modified-Since`.
+
+    With `last_modified=False` (see `validators`), only `If-None-Match` counts.
+    """
+    if "if-none-match" in request.headers:
+        return True
+    return last_modified and "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, headers: dict[str, str]) -> bool:
+    """Return True if the client's cached copy (per `request`) is still fresh.
+
+    `If-None-Match` uses weak comparison and takes precedence over
+    `If-Modified-Since`, as per RFC 9110. `If-Modified-Since` is ignored if
+    `headers` has no `Last-Modified`.
+    """
+    if (if_none_match := request.headers.get("if-none-match")) is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            since = _utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return parsedate_to_datetime(headers["Last-Modified"]) <= since
+    return False
@@ -0,0 +1,106 @@
+"""Streaming serialization of whole tables (NDJSON, CSV, FASTA).
+
+Rows are read from a server-side cursor in partitions of `yield_per` rows and
+serialized one partition at a time, so memory use does not grow with the size of
+the table and the first bytes are sent as soon as the first partition is read.
+"""
+
+import csv
+import io
+import textwrap
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from typing import Any, Literal
+
+from pydantic import BaseModel
+from sqlalchemy.orm import class_mapper
+from sqlmodel import Session, SQLModel, select
+
+ExportFormat = Literal["ndjson", "csv", "fasta"]
+
+MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "fasta": "text/x-fasta",
+}
+
+FASTA_LINE_WIDTH = 60
+
+
+def negotiate_format(
+    accept: str | None, default: ExportFormat = "ndjson"
+) -> ExportFormat:
+    """Return the first export format acceptable to an HTTP `Accept` header."""
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip()
+        for fmt, media in MEDIA_TYPES.items():
+            if media_type == media:
+                return fmt
+    return default
+
+
+def _ndjson(rows: Iterable[BaseModel], _: list[str]) -> str:
+    return "".join(f"{row.model_dump_json()}\n" for row in rows)
+
+
+def _csv_value(value: Any) -> Any:
+    return ";".join(value) if isinstance(value, list) else value
+
+
+def _csv_rows(rows: Iterable[list[Any]]) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+
+def _csv(rows: Iterable[BaseModel], fields: list[str]) -> str:
+    data = (row.model_dump(mode="json") for row in rows)
+    return _csv_rows([_csv_value(d[f]) for f in fields] for d in data)
+
+
+def _fasta(rows: Iterable[BaseModel], _: list[str]) -> str:
+    out = []
+    for row in rows:
+        if seq := getattr(row, "seq", None):
+            header = f">{getattr(row, 'uuid', '')} {getattr(row, 'name', '')}"
+            out.append("\n".join([header, *textwrap.wrap(seq, FASTA_LINE_WIDTH), ""]))
+    return "".join(out)
+
+
+SERIALIZERS: dict[ExportFormat, Callable[[Iterable[BaseModel], list[str]], str]] = {
+    "ndjson": _ndjson,
+    "csv": _csv,
+    "fasta": _fasta,
+}
+
+
+def iter_export(
+    session: Session,
+    model: type[SQLModel],
+    schema: type[BaseModel],
+    fmt: ExportFormat = "ndjson",
+    yield_per: int = 500,
+) -> Iterator[str]:
+    """Yield all rows of `model`, serialized as `schema` in format `fmt`.
+
+    Only the columns in `schema` are selected, and rows are validated directly
+    from the result mappings, so ORM instances are never created.
+    """
+    fields = [f for f in schema.model_fields if hasattr(model, f)]
+    columns = [getattr(model, f) for f in fields]
+    statement = select(*columns).order_by(*class_mapper(model).primary_key)
+    if fmt == "fasta":
+        statement = statement.where(getattr(model, "seq").is_not(None))  # noqa: B009
+
+    serialize = SERIALIZERS[fmt]
+    if fmt == "csv":
+        yield _csv_rows([fields])
+
+    result = session.execute(statement, execution_options={"yield_per": yield_per})
+    for partition in result.mappings().partitions():
+        yield serialize(_validate(schema, partition), fields)
+
+
+def _validate(
+    schema: type[BaseModel], rows: Iterable[Mapping[Any, Any]]
+) -> Iterator[BaseModel]:
+    return (schema.model_validate(dict(row)) for row in rows)
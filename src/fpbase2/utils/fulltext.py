@@ -0,0 +1,140 @@
+"""Full-text search, using sqlite FTS5 or postgres `tsvector`, as available.
+
+`install_fulltext` attaches the DDL for a full-text index to a table, so it is
+created along with the table (and `create_fulltext` adds it to an existing one):
+
+- sqlite: an external-content FTS5 table `<table>_fts`, kept in sync with the
+  table by insert/update/delete triggers, and ranked with `bm25`.
+- postgres: a generated (stored) `search_vector` column with a GIN index, which
+  the database keeps in sync by itself, ranked with `ts_rank`.
+
+Queries are split into words, all of which must match (as prefixes), so user
+input never reaches the full-text query syntax.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Any, TypeVar
+
+from sqlalchemy import DDL, Table, column, event, func, literal_column, table, text
+from sqlmodel import SQLModel, select
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from sqlalchemy.engine import Connection
+    from sqlalchemy.sql.elements import ColumnClause
+    from sqlmodel.sql.expression import SelectOfScalar
+
+M = TypeVar("M", bound=SQLModel)
+
+SEARCH_VECTOR = "search_vector"
+# relative weights of postgres tsvector labels, used for sqlite bm25 as well
+WEIGHTS: dict[str, float] = {"A": 10.0, "B": 5.0, "C": 2.0, "D": 1.0}
+
+
+def _sqlite_ddl(tbl: Table, columns: Mapping[str, str]) -> list[str]:
+    # (identifiers come from table metadata, never from user input)
+    fts, cols = f"{tbl.name}_fts", ", ".join(columns)
+    new = ", ".join(["new.id", *(f"new.{c}" for c in columns)])
+    old = ", ".join(["'delete'", "old.id", *(f"old.{c}" for c in columns)])
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES ({new});"  # noqa: S608
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ({old});"  # noqa: S608
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{tbl.name}', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tbl.name} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tbl.name} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {tbl.name} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def _postgres_ddl(tbl: Table, columns: Mapping[str, str]) -> list[str]:
+    vector = " || ".join(
+        f"setweight(to_tsvector('simple', coalesce({c}::text, '')), '{w}')"
+        for c, w in columns.items()
+    )
+    return [
+        f"ALTER TABLE {tbl.name} ADD COLUMN IF NOT EXISTS {SEARCH_VECTOR} tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{tbl.name}_{SEARCH_VECTOR} "
+        f"ON {tbl.name} USING GIN ({SEARCH_VECTOR})",
+    ]
+
+
+_DDL = {"sqlite": _sqlite_ddl, "postgresql": _postgres_ddl}
+
+
+def install_fulltext(tbl: Table, columns: Mapping[str, str]) -> None:
+    """Create a full-text index on `columns` whenever `tbl` is created.
+
+    `columns` maps column names to a weight label ("A" (highest) to "D").
+    """
+    tbl.info["fulltext"] = dict(columns)
+    for dialect, make_ddl in _DDL.items():
+        for statement in make_ddl(tbl, columns):
+            ddl = DDL(statement).execute_if(dialect=dialect)  # type: ignore [no-untyped-call]
+            event.listen(tbl, "after_create", ddl)
+
+
+def create_fulltext(conn: Connection, tbl: Table) -> None:
+    """Add the full-text index of `tbl` to an existing database, and fill it."""
+    if (make_ddl := _DDL.get(conn.dialect.name)) is None:
+        return
+    for statement in make_ddl(tbl, tbl.info["fulltext"]):
+        conn.execute(text(statement))
+    if conn.dialect.name == "sqlite":
+        fts = f"{tbl.name}_fts"
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))  # noqa: S608
+
+
+def query_terms(query: str) -> list[str]:
+    """Split a user query into lowercase words."""
+    return re.findall(r"\w+", query.lower())
+
+
+def search_statement(
+    model: type[M], query: str, dialect: str
+) -> SelectOfScalar[M] | None:
+    """Return a statement selecting rows of `model` matching `query`, best first.
+
+    Returns None if `query` has no words to search for.
+
+    Raises
+    ------
+    NotImplementedError
+        If full-text search is not supported for `dialect`.
+    """
+    if not (terms := query_terms(query)):
+        return None
+    tbl: Table = model.__table__  # type: ignore [attr-defined]
+    pk = tbl.c.id
+
+    rank: Any
+    if dialect == "sqlite":
+        fts = table(f"{tbl.name}_fts", column("rowid"))
+        weights = [WEIGHTS[label] for label in tbl.info["fulltext"].values()]
+        # bm25 is lower for better matches
+        rank = func.bm25(literal_column(fts.name), *weights)
+        match = " ".join(f'"{term}"*' for term in terms)
+        statement = (
+            select(model)
+            .join(fts, fts.c.rowid == pk)
+            .where(literal_column(fts.name).op("MATCH")(match))
+        )
+    elif dialect == "postgresql":
+        vector: ColumnClause[Any] = literal_column(f"{tbl.name}.{SEARCH_VECTOR}")
+        tsquery = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in terms))
+        # ts_rank takes weights (between 0 and 1) for the labels {D, C, B, A}
+        labels = ",".join(str(WEIGHTS[label] / WEIGHTS["A"]) for label in "DCBA")
+        weights_array: ColumnClause[Any] = literal_column(f"'{{{labels}}}'::float4[]")
+        rank = -func.ts_rank(weights_array, vector, tsquery)
+        statement = select(model).where(vector.op("@@")(tsquery))
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+    return statement.order_by(rank, pk)
@@ -0,0 +1,128 @@
+"""MinHash / locality-sensitive hashing for near-duplicate sequence detection.
+
+The Jaccard similarity of two sequences' k-mer sets is estimated by the fraction
+of equal entries in their MinHash signatures. Signatures are split into `bands`;
+two sequences that agree on every row of any band land in the same bucket, and
+only sequences sharing a bucket are ever compared. Indexing and clustering are
+therefore linear in the number of sequences (rather than quadratic, as with all
+pairwise comparisons), and a sequence can be added or removed at any time.
+
+With `bands` bands of `rows` rows, a pair with similarity `s` becomes a candidate
+with probability `1 - (1 - s**rows) ** bands`: for the defaults (16 x 4), about
+0.5 for s = 0.5 and > 0.99 for s = 0.8.
+"""
+
+from __future__ import annotations
+
+import threading
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+_PRIME = (1 << 31) - 1  # a * crc32 + b stays well within uint64
+
+
+class MinHashLSH:
+    """A thread-safe LSH index of the MinHash signatures of sequence k-mers."""
+
+    def __init__(self, k: int = 5, bands: int = 16, rows: int = 4, seed: int = 0):
+        self.k = k
+        self.bands = bands
+        self.rows = rows
+        self.built = False
+        rng = np.random.default_rng(seed)
+        num_perm = bands * rows
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)[:, None]
+        self._signatures: dict[int, np.ndarray] = {}
+        self._buckets: defaultdict[tuple[int, bytes], set[int]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, seq: str) -> np.ndarray:
+        """Return the MinHash signature of the k-mers in `seq`."""
+        data = seq.upper().encode()
+        shingles = {data[i : i + self.k] for i in range(len(data) - self.k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(s) for s in shingles or (data,)), dtype=np.uint64
+        )
+        signature: np.ndarray = ((self._a * hashes + self._b) % _PRIME).min(axis=1)
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> list[tuple[int, bytes]]:
+        bands = signature.reshape(self.bands, self.rows)
+        return [(i, band.tobytes()) for i, band in enumerate(bands)]
+
+    def _add(self, key: int, seq: str) -> None:
+        self._discard(key)
+        self._signatures[key] = signature = self.signature(seq)
+        for band_key in self._band_keys(signature):
+            self._buckets[band_key].add(key)
+
+    def _discard(self, key: int) -> None:
+        if (signature := self._signatures.pop(key, None)) is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets[band_key]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band_key]
+
+    def update(self, items: Iterable[tuple[int, str | None]]) -> None:
+        """Index (or re-index) sequences by key. A `None` sequence removes the key."""
+        with self._lock:
+            for key, seq in items:
+                if seq:
+                    self._add(key, seq)
+                else:
+                    self._discard(key)
+
+    def build(self, items: Iterable[tuple[int, str | None]]) -> None:
+        """Replace the contents of the index with `items`, and mark it as built."""
+        with self._lock:
+            self._signatures.clear()
+            self._buckets.clear()
+            for key, seq in items:
+                if seq:
+                    self._add(key, seq)
+            self.built = True
+
+    def similarity(self, key1: int, key2: int) -> float:
+        """Return the estimated Jaccard similarity of two indexed sequences."""
+        sig1, sig2 = self._signatures[key1], self._signatures[key2]
+        return float(np.count_nonzero(sig1 == sig2)) / len(sig1)
+
+    def clusters(self, threshold: float = 0.8) -> list[list[int]]:
+        """Return groups of keys whose sequences are near-duplicates.
+
+        Members of each bucket are compared with the first (lowest) key in the
+        bucket, and linked if their estimated similarity is at least `threshold`.
+        Linked keys are merged transitively. Clusters (and their keys) are sorted.
+        """
+        parent: dict[int, int] = {}
+
+        def find(key: int) -> int:
+            while (up := parent.setdefault(key, key)) != key:
+                parent[key] = key = parent[up]  # path halving
+            return key
+
+        with self._lock:
+            for bucket in self._buckets.values():
+                if len(bucket) < 2:
+                    continue
+                first, *others = sorted(bucket)
+                for other in others:
+                    if self.similarity(first, other) >= threshold:
+                        parent[find(other)] = find(first)
+
+        groups: defaultdict[int, list[int]] = defaultdict(list)
+        for key in parent:
+            groups[find(key)].append(key)
+        return sorted(sorted(g) for g in groups.values() if len(g) > 1)
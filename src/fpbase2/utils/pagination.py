@@ -0,0 +1,234 @@
+"""Keyset (cursor) pagination helpers.
+
+Rather than skipping `offset` rows, keyset pagination remembers the sort key of
+the last row on a page and asks for rows *after* it on the next request:
+
+    SELECT ... WHERE (modified, id) > (:modified, :id) ORDER BY modified, id
+
+With an index on the key columns this is an index seek, so every page costs the
+same regardless of depth, and page boundaries don't shift when rows are inserted.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import datetime
+import json
+from functools import cache
+from typing import TYPE_CHECKING, Any, Literal, TypedDict, TypeVar
+
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from sqlalchemy import literal, tuple_
+from sqlmodel import Session, SQLModel, func, select
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from sqlmodel.sql.expression import SelectOfScalar
+
+M = TypeVar("M", bound=SQLModel)
+
+CursorKey = Literal["id", "modified"]
+
+
+class Page(TypedDict):
+    """Keyword arguments of `paginate` that select one page of a listing."""
+
+    limit: int
+    offset: int
+    cursor: str | None
+    order_by: CursorKey
+    where: Sequence[Any]
+
+
+# columns (in sort order) that make up each supported keyset.
+# every keyset must end in a unique column to act as a tie-breaker.
+KEYSETS: dict[str, tuple[str, ...]] = {
+    "id": ("id",),
+    "modified": ("modified", "id"),
+}
+
+
+def encode_cursor(obj: Any, key: CursorKey = "id") -> str:
+    """Return an opaque cursor pointing just after `obj` in the `key` ordering."""
+    values = [getattr(obj, col) for col in KEYSETS[key]]
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v for v in values]
+    raw = json.dumps([key, values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(model: type[SQLModel], cursor: str) -> tuple[CursorKey, list[Any]]:
+    """Decode a cursor created by `encode_cursor`.
+
+    Values are validated (and converted) as the annotation of their column, so
+    a tampered cursor never reaches the database.
+
+    Raises
+    ------
+    HTTPException
+        If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key, values = json.loads(raw)
+        columns = KEYSETS[key]
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        for i, col in enumerate(columns):
+            if (value := _adapter(model, col).validate_python(values[i])) is None:
+                raise ValueError(cursor)
+            values[i] = value
+    except (binascii.Error, TypeError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+    return key, values
+
+
+@cache
+def _adapter(model: type[SQLModel], column: str) -> TypeAdapter[Any]:
+    return TypeAdapter(model.model_fields[column].annotation)
+
+
+def page_statement(
+    model: type[M],
+    *,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    order_by: CursorKey = "id",
+    entities: Sequence[Any] = (),
+    where: Sequence[Any] = (),
+) -> tuple[SelectOfScalar[M], CursorKey]:
+    """Return a statement selecting one page of `model` rows, and its keyset.
+
+    See `paginate` for a description of the parameters.
+    """
+    values: list[Any] = []
+    if cursor is not None:
+        order_by, values = decode_cursor(model, cursor)
+
+    columns = [getattr(model, col) for col in KEYSETS[order_by]]
+    statement = select(*(entities or (model,))).order_by(*columns)
+    if where:
+        statement = statement.where(*where)
+    if values:
+        # bind values with the column types, so they compare as stored
+        bound = (literal(v, c.type) for c, v in zip(columns, values, strict=True))
+        statement = statement.where(tuple_(*columns) > tuple_(*bound))
+    if offset:
+        statement = statement.offset(offset)
+    return statement.limit(limit), order_by
+
+
+def count_statement(
+    model: type[SQLModel], where: Sequence[Any] = ()
+) -> SelectOfScalar[int]:
+    """Return a statement counting the `model` rows that satisfy `where`.
+
+    Rows are counted without being selected, sorted, or paged, so the database
+    can answer from an index covering the `where` columns (if there is one).
+    """
+    statement = select(func.count()).select_from(model)
+    return statement.where(*where) if where else statement
+
+
+def next_page_cursor(
+    rows: Sequence[Any], limit: int, order_by: CursorKey = "id"
+) -> str | None:
+    """Return the cursor for the page after `rows` (None if `rows` was not full)."""
+    if rows and len(rows) == limit:
+        return encode_cursor(rows[-1], order_by)
+    return None
+
+
+def paginate(
+    session: Session,
+    model: type[M],
+    *,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    order_by: CursorKey = "id",
+    entities: Sequence[Any] = (),
+    where: Sequence[Any] = (),
+) -> tuple[Sequence[M], str | None]:
+    """Return one page of `model` rows, and the cursor for the following page.
+
+    Parameters
+    ----------
+    session : Session
+        The database session.
+    model : type[SQLModel]
+        The model to select.
+    limit : int
+        Maximum number of rows to return.
+    offset : int
+        Number of rows to skip (after the cursor, if one is given).
+    cursor : str | None
+        Cursor returned with a previous page. If given, its ordering takes
+        precedence over `order_by`.
+    order_by : {'id', 'modified'}
+        Keyset used to order rows when no cursor is given.
+    entities : Sequence[Any]
+        Columns to select instead of the whole model (e.g. to cheaply fetch
+        only the ids of a page). Must include the columns of the keyset.
+    where : Sequence[Any]
+        Clauses that every row must satisfy (applied before the keyset).
+
+    Returns
+    -------
+    tuple[Sequence[SQLModel], str | None]
+        The rows, and a cursor for the next page (None if this page was not full).
+    """
+    statement, order_by = page_statement(
+        model,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+        order_by=order_by,
+        entities=entities,
+        where=where,
+    )
+    rows = session.exec(statement).all()
+    return rows, next_page_cursor(rows, limit, order_by)
+
+
+def count_rows(
+    session: Session, model: type[SQLModel], where: Sequence[Any] = ()
+) -> int:
+    """Return the number of `model` rows satisfying `where` (see `count_statement`)."""
+    return session.exec(count_statement(model, where)).one()
+
+
+async def apaginate(
+    session: AsyncSession,
+    model: type[M],
+    *,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+    order_by: CursorKey = "id",
+    entities: Sequence[Any] = (),
+    where: Sequence[Any] = (),
+) -> tuple[Sequence[M], str | None]:
+    """Async version of `paginate`."""
+    statement, order_by = page_statement(
+        model,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+        order_by=order_by,
+        entities=entities,
+        where=where,
+    )
+    rows = (await session.exec(statement)).all()
+    return rows, next_page_cursor(rows, limit, order_by)
+
+
+async def acount_rows(
+    session: AsyncSession, model: type[SQLModel], where: Sequence[Any] = ()
+) -> int:
+    """Async version of `count_rows`."""
+    return (await session.exec(count_statement(model, where))).one()
@@ -0,0 +1,132 @@
+"""In-memory inverted k-mer index for peptide and motif search.
+
+Each sequence is broken into its overlapping k-mers, and every k-mer maps to the
+set of keys of the sequences containing it. A query is answered by intersecting
+the posting sets of the k-mers in the query (smallest first), which leaves a
+handful of candidates that are then verified against the actual sequences:
+
+    >>> index = KmerIndex()
+    >>> index.update([(1, "MVSKGEELFTG"), (2, "MVSKGEEDNMA")])
+    >>> index.search("SKGEEL")
+    [1]
+    >>> index.search("GEEXN")  # X matches any residue
+    [2]
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# matches any single residue in a motif query
+WILDCARD = "X"
+
+
+class KmerIndex:
+    """A thread-safe inverted index from k-mers to the keys of sequences."""
+
+    def __init__(self, k: int = 3) -> None:
+        self.k = k
+        self.built = False
+        # incremented on every change, so that derived structures can be refreshed
+        self.version = 0
+        self._postings: defaultdict[str, set[int]] = defaultdict(set)
+        self._seqs: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._seqs)
+
+    def _kmers(self, seq: str) -> set[str]:
+        return {seq[i : i + self.k] for i in range(len(seq) - self.k + 1)}
+
+    def _add(self, key: int, seq: str) -> None:
+        self._discard(key)
+        seq = seq.upper()
+        self._seqs[key] = seq
+        for kmer in self._kmers(seq):
+            self._postings[kmer].add(key)
+
+    def _discard(self, key: int) -> None:
+        if (seq := self._seqs.pop(key, None)) is None:
+            return
+        for kmer in self._kmers(seq):
+            postings = self._postings[kmer]
+            postings.discard(key)
+            if not postings:
+                del self._postings[kmer]
+
+    def update(self, items: Iterable[tuple[int, str | None]]) -> None:
+        """Index (or re-index) sequences by key. A `None` sequence removes the key."""
+        with self._lock:
+            for key, seq in items:
+                if seq:
+                    self._add(key, seq)
+                else:
+                    self._discard(key)
+            self.version += 1
+
+    def build(self, items: Iterable[tuple[int, str | None]]) -> None:
+        """Replace the contents of the index with `items`, and mark it as built."""
+        with self._lock:
+            self._postings.clear()
+            self._seqs.clear()
+            for key, seq in items:
+                if seq:
+                    self._add(key, seq)
+            self.built = True
+            self.version += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._seqs.clear()
+            self.built = False
+            self.version += 1
+
+    def items(self) -> tuple[int, list[tuple[int, str]]]:
+        """Return the index version and a snapshot of its (key, sequence) pairs."""
+        with self._lock:
+            return self.version, sorted(self._seqs.items())
+
+    def _candidates(self, query: str) -> Iterator[int]:
+        # k-mers may only be taken from runs of the query without wildcards
+        kmers = {
+            kmer
+            for run in query.split(WILDCARD)
+            if len(run) >= self.k
+            for kmer in self._kmers(run)
+        }
+        if not kmers:
+            # too short to use the index: every sequence is a candidate
+            return iter(sorted(self._seqs))
+
+        postings = sorted((self._postings.get(kmer, set()) for kmer in kmers), key=len)
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(other)
+        return iter(sorted(candidates))
+
+    def search(self, query: str, limit: int | None = None) -> list[int]:
+        """Return the (sorted) keys of sequences containing `query`.
+
+        `query` is a peptide, in which `X` matches any residue. At most `limit`
+        keys are returned, if given.
+        """
+        query = query.upper()
+        pattern = re.compile(re.escape(query).replace(WILDCARD, "."))
+        found: list[int] = []
+        with self._lock:
+            for key in self._candidates(query):
+                if pattern.search(self._seqs[key]):
+                    found.append(key)
+                    if limit is not None and len(found) >= limit:
+                        break
+        return found
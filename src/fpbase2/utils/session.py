@@ -1,8 +1,18 @@
-from typing import Any, TypeVar
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, TypeVar
 
 from fastapi import HTTPException
-from pydantic import BaseModel
-from sqlmodel import Session, SQLModel
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import class_mapper
+from sqlmodel import Session, SQLModel, select
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from pydantic import BaseModel
+    from sqlmodel.ext.asyncio.session import AsyncSession
 
 M = TypeVar("M", bound=SQLModel)
 
@@ -31,6 +41,50 @@ def create_object(session: Session, model: type[M], data: BaseModel) -> M:
     return db_obj
 
 
+def create_objects(
+    session: Session, model: type[M], data: Sequence[BaseModel], batch_size: int = 500
+) -> list[M]:
+    """Create many objects in the database, in a single transaction.
+
+    Objects are flushed in batches of `batch_size`, and all created rows are then
+    re-read with a single query rather than refreshing each one in turn. SQLAlchemy
+    emits each batch as one multi-row INSERT, as long as it can match the returned
+    primary keys to the objects: on SQLite, that takes a column marked as an
+    `insert_sentinel` (like `Protein.uuid`), or it falls back to one INSERT per row.
+
+    Parameters
+    ----------
+    session : Session
+        The database session.
+    model : type[SQLModel]
+        The model to create.
+    data : Sequence[BaseModel]
+        The data to create each object with.
+    batch_size : int
+        Number of objects to flush per INSERT batch.
+
+    Returns
+    -------
+    list[SQLModel]
+        The created instances of the model, in the same order as `data`.
+    """
+    db_objs = [model.model_validate(item) for item in data]
+    (pk,) = class_mapper(model).primary_key
+    try:
+        for i in range(0, len(db_objs), batch_size):
+            session.add_all(db_objs[i : i + batch_size])
+            session.flush()
+        ids = [getattr(obj, pk.key) for obj in db_objs]
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    if ids:
+        session.exec(select(model).where(pk.in_(ids))).all()
+    return db_objs
+
+
 def read_or_404(session: Session, model: type[M], ident: Any, **kwargs: Any) -> M:
     """Read an object from the database or raise a 404 if it doesn't exist.
 
@@ -95,6 +149,88 @@ def update_object(
     return db_obj
 
 
+def _patch_statement(model: type[M], ident: Any, values: dict[str, Any]) -> Any:
+    table = model.__table__  # type: ignore [attr-defined]
+    (pk,) = class_mapper(model).primary_key
+    if not values:
+        return select(*table.columns).where(pk == ident)
+    return update(table).where(pk == ident).values(**values).returning(*table.columns)
+
+
+def _conflict_statement(model: type[M], ident: Any, values: dict[str, Any]) -> Any:
+    """Return a query for another row sharing a unique column value in `values`."""
+    table = model.__table__  # type: ignore [attr-defined]
+    (pk,) = class_mapper(model).primary_key
+    columns = [c for c in table.columns if c.unique and values.get(c.name) is not None]
+    if not columns:
+        return None
+    matches = or_(*(c == values[c.name] for c in columns))
+    return select(pk, *columns).where(matches, pk != ident).limit(1)
+
+
+def _conflict_error(
+    model: type[M], values: dict[str, Any], other: Any
+) -> HTTPException:
+    """Return a 409 error naming the unique column that `other` shares."""
+    field, value = next(
+        (k, v) for k, v in other._mapping.items() if k in values and v == values[k]
+    )
+    detail = f"{model.__name__} with {field} {value!r} already exists"
+    return HTTPException(status_code=409, detail=detail)
+
+
+def patch_object(
+    session: Session, model: type[M], ident: Any, patch_data: BaseModel
+) -> dict[str, Any]:
+    """Partially update an object, with a single `UPDATE ... RETURNING` statement.
+
+    Unlike `update_object`, the object is neither loaded before nor refreshed
+    after the update. Only fields that were set in `patch_data` are changed,
+    along with the columns the model derives from them (see
+    `FPBaseModel._before_bulk_update`).
+
+    Parameters
+    ----------
+    session : Session
+        The database session.
+    model : type[SQLModel]
+        The model to update.
+    ident : Any
+        The identifier of the object to update.
+    patch_data : BaseModel
+        The data to update the object with.
+
+    Returns
+    -------
+    dict[str, Any]
+        The column values of the updated row.
+
+    Raises
+    ------
+    HTTPException
+        If the object doesn't exist (404), or if the update would give it the
+        same value of a unique column as another object (409).
+    """
+    values = model._before_bulk_update(patch_data.model_dump(exclude_unset=True))  # type: ignore [attr-defined]
+    try:
+        row = session.exec(_patch_statement(model, ident, values)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+        if values:
+            model._after_bulk_update(session, [ident], values, [row])  # type: ignore [attr-defined]
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if (statement := _conflict_statement(model, ident, values)) is not None:
+            if (other := session.exec(statement).first()) is not None:
+                raise _conflict_error(model, values, other) from e
+        raise
+    except Exception:
+        session.rollback()
+        raise
+    return dict(row._mapping)
+
+
 def delete_object(session: Session, model: type[M], ident: Any, **kwargs: Any) -> dict:
     """Delete an object from the database.
 
@@ -121,3 +257,78 @@ def delete_object(session: Session, model: type[M], ident: Any, **kwargs: Any) -
     session.delete(db_obj)
     session.commit()
     return {"ok": True}
+
+
+# async versions, for use with an AsyncSession (see `core.db.get_async_session`)
+
+
+async def acreate_object(session: AsyncSession, model: type[M], data: BaseModel) -> M:
+    """Async version of `create_object`."""
+    db_obj = model.model_validate(data)
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def aread_or_404(
+    session: AsyncSession, model: type[M], ident: Any, **kwargs: Any
+) -> M:
+    """Async version of `read_or_404`."""
+    if obj := await session.get(model, ident, **kwargs):
+        return obj
+    raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+
+
+async def aupdate_object(
+    session: AsyncSession,
+    model: type[M],
+    ident: Any,
+    update_data: BaseModel,
+    **kwargs: Any,
+) -> M:
+    """Async version of `update_object`."""
+    db_obj = await aread_or_404(session, model, ident, **kwargs)
+
+    for key, value in update_data.model_dump(exclude_unset=True).items():
+        setattr(db_obj, key, value)
+
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def apatch_object(
+    session: AsyncSession, model: type[M], ident: Any, patch_data: BaseModel
+) -> dict[str, Any]:
+    """Async version of `patch_object`."""
+    values = model._before_bulk_update(patch_data.model_dump(exclude_unset=True))  # type: ignore [attr-defined]
+    statement = _patch_statement(model, ident, values)
+    try:
+        row = (await session.exec(statement)).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"{model.__name__} not found")
+        if values:
+            await session.run_sync(model._after_bulk_update, [ident], values, [row])  # type: ignore [attr-defined]
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        if (statement := _conflict_statement(model, ident, values)) is not None:
+            if (other := (await session.exec(statement)).first()) is not None:
+                raise _conflict_error(model, values, other) from e
+        raise
+    except Exception:
+        await session.rollback()
+        raise
+    return dict(row._mapping)
+
+
+async def adelete_object(
+    session: AsyncSession, model: type[M], ident: Any, **kwargs: Any
+) -> dict:
+    """Async version of `delete_object`."""
+    db_obj = await aread_or_404(session, model, ident, **kwargs)
+    await session.delete(db_obj)
+    await session.commit()
+    return {"ok": True}
@@ -0,0 +1,98 @@
+"""Vectorized sequence similarity search.
+
+All indexed sequences are encoded as rows of a zero-padded `uint8` matrix (one
+byte per residue), so that comparing a query against every sequence at a given
+offset is a single array comparison. Identity is scored without gaps, allowing
+the query to slide up to `band` residues relative to each target, which tolerates
+N-terminal insertions/deletions (e.g. a missing initial methionine):
+
+    identity = 100 * max_shift(matching residues) / max(len(query), len(target))
+
+The matrix is derived from a `KmerIndex` and rebuilt whenever the index changes,
+so it is shared by all queries (and requests) between writes.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING, NamedTuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .seqindex import KmerIndex
+
+
+class Hit(NamedTuple):
+    key: int
+    identity: float
+
+
+def encode(seqs: Sequence[str], width: int | None = None) -> np.ndarray:
+    """Encode sequences as rows of a `uint8` matrix, padded with zeros."""
+    width = max(map(len, seqs), default=0) if width is None else width
+    matrix = np.zeros((len(seqs), width), dtype=np.uint8)
+    for row, seq in enumerate(seqs):
+        data = seq.upper().encode("ascii", "replace")[:width]
+        matrix[row, : len(data)] = np.frombuffer(data, dtype=np.uint8)
+    return matrix
+
+
+class SimilarityIndex:
+    """Percent-identity search against the sequences of a `KmerIndex`."""
+
+    def __init__(self, source: KmerIndex) -> None:
+        self.source = source
+        self._version: int | None = None
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._matrix = np.zeros((0, 0), dtype=np.uint8)
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._version != self.source.version:
+                version, items = self.source.items()
+                seqs = [seq for _, seq in items]
+                self._keys = np.array([key for key, _ in items], dtype=np.int64)
+                self._lengths = np.array(list(map(len, seqs)), dtype=np.int32)
+                self._matrix = encode(seqs)
+                self._version = version
+            return self._keys, self._lengths, self._matrix
+
+    def search(
+        self, queries: Sequence[str], top: int = 10, band: int = 0
+    ) -> list[list[Hit]]:
+        """Return the `top` most similar sequences to each query, best first."""
+        keys, lengths, matrix = self._refresh()
+        if not len(keys):
+            return [[] for _ in queries]
+
+        results = []
+        for query, encoded in zip(queries, encode(queries), strict=True):
+            scores = self._identity(encoded[: len(query)], lengths, matrix, band)
+            n = min(top, len(scores))
+            best = np.argpartition(-scores, n - 1)[:n]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            results.append([Hit(int(keys[i]), float(scores[i])) for i in best])
+        return results
+
+    @staticmethod
+    def _identity(
+        query: np.ndarray, lengths: np.ndarray, matrix: np.ndarray, band: int
+    ) -> np.ndarray:
+        m, width = len(query), matrix.shape[1]
+        best = np.zeros(len(matrix), dtype=np.int32)
+        for shift in range(-band, band + 1):
+            # query[i] is compared with target[i + shift]
+            start, stop = max(0, -shift), min(m, width - shift)
+            if start >= stop:
+                continue
+            window = matrix[:, start + shift : stop + shift]
+            # padding (0) never equals a residue, so only real residues match
+            matches = np.count_nonzero(window == query[start:stop], axis=1)
+            np.maximum(best, matches, out=best)
+        identity: np.ndarray = 100 * best / np.maximum(lengths, m)
+        return identity
@@ -1,10 +1,11 @@
+import hashlib
 import re
 import secrets
 import unicodedata
 from collections.abc import Container, Sequence
 from typing import Any
 
-from sqlalchemy import Connection, text
+from sqlalchemy import ColumnElement, Connection, select
 
 
 def slugify(value: Any, allow_unicode: bool = False) -> str:
@@ -26,6 +27,21 @@ def slugify(value: Any, allow_unicode: bool = False) -> str:
     return re.sub(r"[-\s]+", "-", v)
 
 
+def normalize_seq(seq: str) -> str:
+    """Normalize a protein sequence: remove whitespace and stop (*), uppercase."""
+    return re.sub(r"[\s*]", "", seq).upper()
+
+
+def seq_digest(seq: str | None) -> str | None:
+    """Return a hex digest of the normalized `seq`, for exact-match lookups.
+
+    Returns None if `seq` has no residues, so that it matches no other sequence.
+    """
+    if not seq or not (normalized := normalize_seq(seq)):
+        return None
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
 def new_id(
     k: int = 5,
     opts: Sequence[str] = "ABCDEFGHJKLMNOPQRSTUVWXYZ123456789",
@@ -35,21 +51,43 @@ def new_id(
 
 
 def new_unique_id(
-    conn: Connection | None = None, existing: Container[str] = (), tries: int = 1000
+    conn: Connection | None = None,
+    existing: Container[str] = (),
+    tries: int = 1000,
+    column: ColumnElement[str] | None = None,
 ) -> str:
-    if conn is None:
-        if not existing:
-            raise ValueError("Must provide existing uuids if no connection is given.")
-        for _ in range(tries):
-            if (_uuid := new_id()) not in existing:
-                return _uuid
-    else:
-        for _ in range(tries):
-            _uuid = new_id()
-            result = conn.execute(
-                text("SELECT 1 FROM protein WHERE uuid = :uuid"), {"uuid": _uuid}
-            )
-            if result.scalar() is None:
-                return _uuid
+    """Return a new id that is not in `existing` (or in `column` if `conn` is given)."""
+    return new_unique_ids(1, conn, existing, tries, column)[0]
+
+
+def new_unique_ids(
+    n: int,
+    conn: Connection | None = None,
+    existing: Container[str] = (),
+    tries: int = 1000,
+    column: ColumnElement[str] | None = None,
+) -> list[str]:
+    """Return `n` distinct new ids that are not already in use.
+
+    If `conn` is given, ids already present in the database `column` are avoided.
+    Candidate ids are checked in blocks with a single `WHERE column IN (...)`
+    query, so the number of queries does not grow with `n` (collisions are rare,
+    so a second attempt is almost never needed).
+    """
+    if conn is None and not existing:
+        raise ValueError("Must provide existing uuids if no connection is given.")
+    if conn is not None and column is None:
+        raise ValueError("Must provide a column to check if a connection is given.")
+
+    ids: set[str] = set()
+    for _ in range(tries):
+        candidates = {new_id() for _ in range(n - len(ids))} - ids
+        candidates = {c for c in candidates if c not in existing}
+        if conn is not None and column is not None and candidates:
+            stmt = select(column).where(column.in_(candidates))
+            candidates -= set(conn.execute(stmt).scalars())
+        ids |= candidates
+        if len(ids) == n:
+            return list(ids)
 
     raise RuntimeError(f"Could not generate unique uuid after {tries} tries.")